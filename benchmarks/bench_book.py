@@ -0,0 +1,132 @@
+"""Measure BOK parsing and writing on a synthetic 100-page book.
+
+Usage: python benchmarks/bench_book.py [--pages N] [--repeat N]
+
+The per-byte paragraph scan is the parser the fast one replaced; it is kept
+here as the baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from collections.abc import Callable
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from filebuffer import FileBuffer
+
+from baktt.book import Book, ImageInfo, PageData, TextInfo
+
+
+def make_book(path: Path, num_pages: int) -> None:
+    """Write a book of `num_pages` pages with a few italic paragraphs on each."""
+    rnd = random.Random(0)
+    words = ["the", "king", "of", "Krondor", "and", "his", "squire", "rode", "north"]
+    pages: list[PageData] = []
+    for i in range(num_pages):
+        text_blocks = []
+        for _ in range(rnd.randint(2, 6)):
+            sentences = [
+                rnd.choice(("\\i", "\\I"))
+                + " ".join(rnd.choice(words) for _ in range(rnd.randint(5, 30)))
+                + "."
+                for _ in range(rnd.randint(1, 4))
+            ]
+            text_blocks.append(
+                TextInfo(paragraph=True, skips=[bytes(16)], text=" ".join(sentences))
+            )
+        pages.append(
+            PageData(
+                x_pos=16,
+                y_pos=16,
+                width=288,
+                height=168,
+                number=i + 1,
+                id=i,
+                prev_id=max(i - 1, 0),
+                next_id=i + 1,
+                flag=0,
+                show_number=True,
+                decorations=[ImageInfo(0, 0, 1, 0)],
+                first_letters=[ImageInfo(16, 16, 2, 0)],
+                text_blocks=text_blocks,
+                skips=[b"", bytes(30)],
+            )
+        )
+    Book(pages=pages).to_file(path)
+
+
+class PerBytePageData(PageData):
+    @classmethod
+    def read_paragraph(cls, buf: FileBuffer, data: memoryview) -> tuple[TextInfo, int]:
+        skips: list[bytes] = [buf.read(16)]
+
+        bytes_buf = BytesIO()
+
+        char = buf.read(1)
+        while char not in (b"\xf1", b"\xf0"):
+            bytes_buf.write(char)
+            char = buf.read(1)
+
+        bytes_buf.seek(0)
+        paragraph = TextInfo(
+            paragraph=True,
+            skips=skips,
+        )
+        paragraph.bytes = bytes_buf.read()
+        return paragraph, ord(char)
+
+
+def read_pages(path: Path, page_class: type[PageData]) -> list[PageData]:
+    """Parse every page like `Book.from_file`, with the given paragraph parser."""
+    buf = FileBuffer.from_file(path)
+    _ = buf.uint32LE()  # file size
+    num_pages = buf.uint16LE()
+    pages = []
+    for page_offset in buf.read_array("I", num_pages):
+        buf.seek(4 + page_offset)
+        pages.append(page_class.from_buf(buf))
+    return pages
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "BENCH.BOK"
+        make_book(path, args.pages)
+        book = Book.from_file(path)
+        assert read_pages(path, PerBytePageData) == book.pages
+
+        size = path.stat().st_size
+        print(f"{args.pages} pages, {size} bytes")
+        print(f"{'operation':<24}{'ms':>10}{'MB/s':>10}")
+        for name, func in {
+            "pages (per byte)": lambda: read_pages(path, PerBytePageData),
+            "pages": lambda: read_pages(path, PageData),
+            "Book.from_file": lambda: Book.from_file(path),
+            "Book.to_file": lambda: book.to_file(path),
+            "Book.open + to_file": lambda: Book.open(path).to_file(path),
+        }.items():
+            best = measure(func, args.repeat)
+            mb_per_s = size / best / 1024 / 1024
+            print(f"{name:<24}{best * 1000:>10.2f}{mb_per_s:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Measure throughput and allocations of every RLE/LZW/LZSS entry point.
+
+Usage: python benchmarks/bench_codecs.py [--repeat N] [--output RESULTS.json]
+                                         [--compare BASELINE.json]
+
+The corpora are synthetic, shaped like the game data: sparse glyph bitmaps,
+320x200 paletted screens, 640x350 4-bit book screens and random noise.
+
+Native allocations (output buffers, encoder tables, decoder state) are counted
+by the extension itself, which needs a benchmark build:
+
+    FILEBUFFER_BENCHMARKS=1 python setup.py build_ext --inplace
+
+Allocations of Python objects are counted separately with tracemalloc.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+import _filebuffer
+from corpora import corpora
+from filebuffer import (
+    COMPRESSION_LZSS,
+    COMPRESSION_LZW,
+    COMPRESSION_RLE,
+    FileBuffer,
+)
+
+CODECS = {
+    "RLE": COMPRESSION_RLE,
+    "LZW": COMPRESSION_LZW,
+    "LZSS": COMPRESSION_LZSS,
+}
+
+
+def _buffer(data: bytes) -> FileBuffer:
+    buf = FileBuffer(len(data))
+    buf.write(data)
+    buf.seek(0)
+    return buf
+
+
+# The operation, the bytes it handles and, for encoders, the compressed size
+EntryPoint = tuple[Callable[[], object], int, int | None]
+
+
+def entry_points(codec: str, data: bytes) -> dict[str, EntryPoint]:
+    """Return the operations to time for `codec`."""
+    method = CODECS[codec]
+    src = _buffer(data)
+    compressed_size, compressed = getattr(src, f"compress{codec}")()
+    dst = FileBuffer(len(data))
+
+    def compress() -> None:
+        src.seek(0)
+        getattr(src, f"compress{codec}")()
+
+    def decompress() -> None:
+        compressed.seek(0)
+        getattr(compressed, f"decompress{codec}")(len(data))
+
+    def decompress_into() -> None:
+        compressed.seek(0)
+        dst.seek(0)
+        getattr(compressed, f"decompress{codec}_into")(dst)
+
+    def decoder() -> None:
+        compressed.seek(0)
+        for _ in compressed.decoder(method, len(data)).chunks():
+            pass
+
+    operations: dict[str, EntryPoint] = {
+        f"compress{codec}": (compress, len(data), compressed_size),
+    }
+    if codec == "RLE":
+        # The mode used for fonts and RLE-compressed BMX files
+        src.seek(0)
+        optimal_size, _ = src.compressRLE("optimal")
+
+        def compress_optimal() -> None:
+            src.seek(0)
+            src.compressRLE("optimal")
+
+        operations["compressRLE optimal"] = (compress_optimal, len(data), optimal_size)
+    operations |= {
+        f"decompress{codec}": (decompress, len(data), None),
+        f"decompress{codec}_into": (decompress_into, len(data), None),
+        f"decoder{codec}": (decoder, len(data), None),
+    }
+    return operations
+
+
+def measure(func: Callable[[], object], size: int, repeat: int) -> dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    # Separate runs, since counting slows everything down
+    _filebuffer.ResetAllocationStats()
+    func()
+    native_allocations, native_peak = _filebuffer.GetAllocationStats()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    func()
+    after = tracemalloc.take_snapshot()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+
+    return {
+        "mb_per_s": size / best / 1024 / 1024,
+        "native_allocations": native_allocations,
+        "native_peak_bytes": native_peak,
+        "python_allocations": sum(max(stat.count_diff, 0) for stat in stats),
+        "python_peak_bytes": python_peak,
+    }
+
+
+def run(repeat: int) -> dict[str, dict[str, dict[str, float]]]:
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    for corpus, data in corpora().items():
+        results[corpus] = {}
+        for codec in CODECS:
+            for name, (func, size, compressed_size) in entry_points(
+                codec, data
+            ).items():
+                results[corpus][name] = measure(func, size, repeat)
+                if compressed_size is not None:
+                    results[corpus][name]["ratio"] = compressed_size / size
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    if not hasattr(_filebuffer, "GetAllocationStats"):
+        parser.error("the extension was built without FILEBUFFER_BENCHMARKS=1")
+
+    results = run(args.repeat)
+    baseline = json.loads(args.compare.read_text())["results"] if args.compare else {}
+
+    print(
+        f"{'corpus':<16}{'operation':<32}{'MB/s':>10}"
+        f"{'allocs':>8}{'peak KB':>10}{'py allocs':>10}{'ratio':>8}"
+    )
+    for corpus, operations in results.items():
+        for name, result in operations.items():
+            line = (
+                f"{corpus:<16}{name:<32}{result['mb_per_s']:>10.1f}"
+                f"{result['native_allocations']:>8}"
+                f"{result['native_peak_bytes'] / 1024:>10.1f}"
+                f"{result['python_allocations']:>10}"
+            )
+            line += f"{result['ratio']:>8.3f}" if "ratio" in result else " " * 8
+            previous = baseline.get(corpus, {}).get(name)
+            if previous:
+                line += f"{result['mb_per_s'] / previous['mb_per_s']:>9.2f}x"
+            print(line)
+
+    if args.output:
+        args.output.write_text(
+            json.dumps(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "repeat": args.repeat,
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
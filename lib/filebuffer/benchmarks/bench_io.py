@@ -0,0 +1,103 @@
+"""Compare per-byte and bulk FileBuffer I/O on a synthetic resource archive.
+
+Usage: python benchmarks/bench_io.py [--size MEGABYTES]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import struct
+import time
+from collections.abc import Callable
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from filebuffer import FileBuffer
+
+RES_FILENAME_LEN = 13
+
+
+def make_archive(path: Path, size: int) -> None:
+    """Write a `krondor.001`-like archive of roughly `size` bytes."""
+    rnd = random.Random(0)
+    with path.open("wb") as f:
+        written = 0
+        index = 0
+        while written < size:
+            data_size = min(rnd.randint(1_000, 64_000), size - written)
+            name = f"RES{index:05d}.BIN".encode().ljust(RES_FILENAME_LEN, b"\x00")
+            f.write(name)
+            f.write(struct.pack("<I", data_size))
+            f.write(rnd.randbytes(data_size))
+            written += RES_FILENAME_LEN + 4 + data_size
+            index += 1
+
+
+def per_byte_from_file(path: Path) -> FileBuffer:
+    data = path.read_bytes()
+    fb = FileBuffer(len(data))
+    for b in data:
+        fb.put_uint8(b)
+    fb.seek(0)
+    return fb
+
+
+def per_byte_read(fb: FileBuffer) -> bytes:
+    fb.seek(0)
+    return bytes(fb.uint8() for _ in range(fb.size()))
+
+
+def per_byte_write(fb: FileBuffer, data: bytes) -> None:
+    fb.seek(0)
+    for b in data:
+        fb.put_uint8(b)
+
+
+def bulk_read(fb: FileBuffer) -> bytes:
+    fb.seek(0)
+    return fb.read()
+
+
+def bulk_write(fb: FileBuffer, data: bytes) -> None:
+    fb.seek(0)
+    fb.write(data)
+
+
+def timed(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=10, help="archive size in MB")
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        path = Path(tmp) / "krondor.001"
+        make_archive(path, args.size * 1024 * 1024)
+        data = path.read_bytes()
+        fb = FileBuffer.from_file(path)
+
+        cases: list[tuple[str, Callable[[], object], Callable[[], object]]] = [
+            (
+                "from_file",
+                lambda: per_byte_from_file(path),
+                lambda: FileBuffer.from_file(path),
+            ),
+            ("read", lambda: per_byte_read(fb), lambda: bulk_read(fb)),
+            ("write", lambda: per_byte_write(fb, data), lambda: bulk_write(fb, data)),
+        ]
+
+        print(f"Archive: {len(data) / 1024 / 1024:.1f} MB")
+        print(f"{'operation':<12}{'per-byte':>12}{'bulk':>12}{'speedup':>10}")
+        for name, per_byte, bulk in cases:
+            slow = timed(per_byte)
+            fast = timed(bulk)
+            print(f"{name:<12}{slow:>11.3f}s{fast:>11.4f}s{slow / fast:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compare LZW encoder throughput with an open-addressing and a std::map dictionary.
+
+Usage: python benchmarks/bench_lzw.py [--repeat N]
+
+The std::map encoder is not part of the regular build. Build the extension with
+FILEBUFFER_BENCHMARKS=1 to include it:
+
+    FILEBUFFER_BENCHMARKS=1 python setup.py build_ext --inplace
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from corpora import corpora
+from filebuffer import FileBuffer
+
+
+def throughput(compress_name: str, data: bytes, repeat: int) -> float:
+    buf = FileBuffer(len(data))
+    buf.write(data)
+    result = FileBuffer(len(data) * 2 + 16)
+    compress = getattr(buf._fb, compress_name)
+    best = float("inf")
+    for _ in range(repeat):
+        buf.seek(0)
+        start = time.perf_counter()
+        compress(result._fb)
+        best = min(best, time.perf_counter() - start)
+    return len(data) / best / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    if not hasattr(FileBuffer(0)._fb, "CompressLZWMap"):
+        parser.error("the extension was built without FILEBUFFER_BENCHMARKS=1")
+
+    print(f"{'corpus':<16}{'flat MB/s':>12}{'map MB/s':>12}{'speedup':>10}")
+    for name, data in corpora().items():
+        flat = throughput("CompressLZW", data, args.repeat)
+        std_map = throughput("CompressLZWMap", data, args.repeat)
+        print(f"{name:<16}{flat:>12.1f}{std_map:>12.1f}{flat / std_map:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Measure how BMX decompression scales across threads.
+
+Usage: python benchmarks/bench_threads.py [RESOURCE_DIR] [--threads 1 2 4 8]
+
+RESOURCE_DIR is a directory produced by `baktt resources extract`. Without it, a
+synthetic set of RLE-compressed images is used instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+from filebuffer import (
+    COMPRESSION_LZSS,
+    COMPRESSION_LZW,
+    COMPRESSION_RLE,
+    FileBuffer,
+)
+
+Job = Callable[[], FileBuffer]
+
+DECOMPRESS: dict[int, Callable[[FileBuffer, int], FileBuffer]] = {
+    COMPRESSION_LZW: FileBuffer.decompressLZW,
+    COMPRESSION_LZSS: FileBuffer.decompressLZSS,
+    COMPRESSION_RLE: FileBuffer.decompressRLE,
+}
+
+
+@dataclass(frozen=True)
+class Payload:
+    """Compressed image data and what it decompresses to."""
+
+    data: bytes
+    compression: int
+    uncompressed_size: int
+
+
+def load_bmx_payloads(resource_dir: Path) -> list[Payload]:
+    payloads: list[Payload] = []
+    for path in sorted(resource_dir.glob("*.BMX")):
+        buf = FileBuffer.from_file(path)
+        if buf.uint16LE() != 0x1066:
+            continue
+        compression = buf.uint16LE()
+        num_images = buf.uint16LE()
+        buf.skip(2)
+        uncompressed_size = buf.uint32LE()
+        buf.skip(8 * num_images)
+        if compression == COMPRESSION_LZW:
+            buf.skip(5)
+        payloads.append(Payload(buf.read(), compression, uncompressed_size))
+    return payloads
+
+
+def synthetic_payloads(count: int = 400, size: int = 256_000) -> list[Payload]:
+    rnd = random.Random(0)
+    payloads: list[Payload] = []
+    for _ in range(count):
+        data = bytes(rnd.choice(b"\x00\x00\x00\x11\x22") for _ in range(size // 64))
+        src = FileBuffer(size)
+        src.write(data * 64)
+        _, buf = src.compressRLE()
+        payloads.append(Payload(buf.read(), COMPRESSION_RLE, size))
+    return payloads
+
+
+def make_jobs(payloads: list[Payload], repeat: int) -> list[Job]:
+    # A buffer must not be used by two threads at once, so every job gets its
+    # own source buffer, and decompressing allocates its own result
+    jobs: list[Job] = []
+    for _ in range(repeat):
+        for payload in payloads:
+            src = FileBuffer(len(payload.data))
+            src.write(payload.data)
+            src.seek(0)
+            decompress = DECOMPRESS[payload.compression]
+            jobs.append(partial(decompress, src, payload.uncompressed_size))
+    return jobs
+
+
+def run(jobs: list[Job], threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(job) for job in jobs]:
+            future.result()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("resource_dir", type=Path, nargs="?")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.resource_dir:
+        payloads = load_bmx_payloads(args.resource_dir)
+        print(f"{len(payloads)} BMX files from {args.resource_dir}")
+    else:
+        payloads = synthetic_payloads()
+        print(f"{len(payloads)} synthetic RLE images")
+
+    baseline = run(make_jobs(payloads, args.repeat), 1)
+    print(f"{'threads':>8}{'time':>10}{'speedup':>10}")
+    for threads in args.threads:
+        elapsed = (
+            baseline if threads == 1 else run(make_jobs(payloads, args.repeat), threads)
+        )
+        print(f"{threads:>8}{elapsed:>9.3f}s{baseline / elapsed:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Synthetic data shaped like the game's, shared by the benchmarks."""
+
+from __future__ import annotations
+
+import random
+
+
+def corpora() -> dict[str, bytes]:
+    rnd = random.Random(0)
+
+    # Font glyph buffer: offsets, widths and mostly empty 16-pixel rows
+    glyphs = bytearray()
+    for i in range(256):
+        glyphs += (i * 22).to_bytes(2, "little")
+    glyphs += bytes(rnd.randint(3, 12) for _ in range(256))
+    row_bytes = (0x00, 0x00, 0x00, 0x18, 0x3C, 0x66)
+    for _ in range(256 * 11):
+        glyphs += bytes(rnd.choice(row_bytes) for _ in range(2))
+
+    # 320x200 paletted screen: horizontal spans of a few colors
+    screen = bytearray()
+    while len(screen) < 320 * 200:
+        screen += bytes([rnd.choice((0, 0, 17, 42, 128, 200))]) * rnd.randint(1, 24)
+
+    # 640x350 book screen, two 4-bit pixels per byte
+    book = bytes(rnd.choice((0x00, 0x00, 0x11, 0x1F, 0xF1)) for _ in range(320 * 350))
+
+    return {
+        "glyphs": bytes(glyphs),
+        "screen 320x200": bytes(screen[: 320 * 200]),
+        "book 640x350": book,
+        "noise 256K": rnd.randbytes(256 * 1024),
+    }
@@ -1,12 +1,27 @@
+import os
+
 from pybind11.setup_helpers import Pybind11Extension, build_ext
 from setuptools import find_packages, setup
 
 __version__ = "0.0.1"
 
+# FILEBUFFER_BENCHMARKS=1 also builds the reference code and the allocation
+# counters used by the benchmarks
+define_macros = []
+if os.environ.get("FILEBUFFER_BENCHMARKS"):
+    define_macros.append(("FILEBUFFER_BENCHMARKS", "1"))
+
 ext_modules = [
     Pybind11Extension(
         "_filebuffer",
-        ["src/Exception.cpp", "src/FileBuffer.cpp", "src/pybind.cpp"],
+        [
+            "src/AllocationStats.cpp",
+            "src/Decoder.cpp",
+            "src/Exception.cpp",
+            "src/FileBuffer.cpp",
+            "src/pybind.cpp",
+        ],
+        define_macros=define_macros,
     ),
 ]
 
@@ -20,7 +35,7 @@ setup(
     ext_modules=ext_modules,
     cmdclass={"build_ext": build_ext},
     zip_safe=False,
-    python_requires=">=3.6",
+    python_requires=">=3.13",
     packages=find_packages("src"),
     package_dir={"": "src"},
 )
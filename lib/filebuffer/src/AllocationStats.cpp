@@ -0,0 +1,104 @@
+#ifdef FILEBUFFER_BENCHMARKS
+
+#include <atomic>
+#include <cstdlib>
+#include <new>
+
+#if defined(__APPLE__)
+#include <malloc/malloc.h>
+#define USABLE_SIZE(p) malloc_size(p)
+#elif defined(_WIN32)
+#include <malloc.h>
+#define USABLE_SIZE(p) _msize(p)
+#else
+#include <malloc.h>
+#define USABLE_SIZE(p) malloc_usable_size(p)
+#endif
+
+#include "AllocationStats.h"
+
+// The replacement operators below stay within this extension (its symbols are
+// hidden), but memory may still be freed on the other side of the boundary.
+// Both sides use malloc and free, and sizes are taken from the allocator
+// rather than from a header, so that is safe.
+static std::atomic<size_t> allocations(0);
+static std::atomic<long long> current(0);
+static std::atomic<long long> peak(0);
+static std::atomic<long long> baseline(0);
+
+static void *
+Allocate(size_t n)
+{
+    void *p = std::malloc(n ? n : 1);
+    if (!p)
+    {
+        throw std::bad_alloc();
+    }
+    allocations++;
+    long long now = current += (long long)USABLE_SIZE(p);
+    long long highest = peak.load();
+    while ((now > highest) && !peak.compare_exchange_weak(highest, now))
+    {
+    }
+    return p;
+}
+
+static void
+Release(void *p)
+{
+    if (p)
+    {
+        current -= (long long)USABLE_SIZE(p);
+        std::free(p);
+    }
+}
+
+void *operator new(size_t n)
+{
+    return Allocate(n);
+}
+
+void *operator new[](size_t n)
+{
+    return Allocate(n);
+}
+
+void operator delete(void *p) noexcept
+{
+    Release(p);
+}
+
+void operator delete[](void *p) noexcept
+{
+    Release(p);
+}
+
+void operator delete(void *p, size_t) noexcept
+{
+    Release(p);
+}
+
+void operator delete[](void *p, size_t) noexcept
+{
+    Release(p);
+}
+
+void
+ResetAllocationStats()
+{
+    allocations = 0;
+    baseline = current.load();
+    peak = baseline.load();
+}
+
+AllocationStats
+GetAllocationStats()
+{
+    AllocationStats stats;
+    stats.allocations = allocations;
+    long long above = peak - baseline;
+    stats.peak = above > 0 ? (size_t)above : 0;
+    return stats;
+}
+
+#endif
@@ -0,0 +1,22 @@
+#ifndef ALLOCATIONSTATS_H
+#define ALLOCATIONSTATS_H
+
+#ifdef FILEBUFFER_BENCHMARKS
+
+#include <cstddef>
+
+// Counts of the allocations made through operator new in this extension, for
+// the benchmarks. Only built with FILEBUFFER_BENCHMARKS.
+struct AllocationStats
+{
+    size_t allocations;
+    // Highest number of bytes allocated at once since the last reset
+    size_t peak;
+};
+
+void ResetAllocationStats();
+AllocationStats GetAllocationStats();
+
+#endif
+
+#endif
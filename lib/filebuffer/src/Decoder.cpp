@@ -0,0 +1,263 @@
+/*
+ * This file is part of xBaK.
+ *
+ * xBaK is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * xBaK is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with xBaK.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ * Copyright (C) Guido de Jong <guidoj@users.sf.net>
+ */
+
+#include "Decoder.h"
+#include "Defines.h"
+#include "Exception.h"
+
+Decoder::Decoder(FileBuffer *src, const unsigned int m, const unsigned int n)
+        : source(src)
+        , method(m)
+        , remaining(n)
+        , pending(0)
+        , repeat(false)
+        , value(0)
+        , history()
+        , matchpos(0)
+        , code(0)
+        , mask(0)
+        , codetable()
+        , decodestack()
+        , n_bits(9)
+        , free_entry(257)
+        , oldcode(0)
+        , lastbyte(0)
+        , bitpos(0)
+        , started(false)
+{
+    switch (method)
+    {
+    case COMPRESSION_LZW:
+        codetable.resize(4096);
+        decodestack.reserve(4096);
+        break;
+    case COMPRESSION_LZSS:
+        // Matches are copied from the history while it grows, so it must never be reallocated
+        history.reserve(n);
+        break;
+    case COMPRESSION_RLE:
+        break;
+    default:
+        throw CompressionError(__FILE__, __LINE__, "", method);
+        break;
+    }
+}
+
+Decoder::~Decoder()
+{
+}
+
+unsigned int
+Decoder::GetBytesLeft() const
+{
+    return remaining;
+}
+
+unsigned int
+Decoder::Decode(FileBuffer *result)
+{
+    try
+    {
+        unsigned int n = MIN(remaining, result->GetBytesLeft());
+        unsigned int done = 0;
+        switch (method)
+        {
+        case COMPRESSION_LZW:
+            done = DecodeLZW(result, n);
+            break;
+        case COMPRESSION_LZSS:
+            done = DecodeLZSS(result, n);
+            break;
+        case COMPRESSION_RLE:
+            done = DecodeRLE(result, n);
+            break;
+        }
+        remaining -= done;
+        return done;
+    }
+    catch (Exception &e)
+    {
+        e.Print("Decoder::Decode");
+        throw;
+    }
+    return 0;
+}
+
+unsigned int
+Decoder::DecodeLZW(FileBuffer *result, const unsigned int n)
+{
+    unsigned int done = 0;
+    while (done < n)
+    {
+        if (!decodestack.empty())
+        {
+            result->PutUint8(decodestack.back());
+            decodestack.pop_back();
+            done++;
+        }
+        else if (source->AtEnd())
+        {
+            break;
+        }
+        else if (!started)
+        {
+            oldcode = source->GetBits(n_bits);
+            lastbyte = oldcode;
+            result->PutUint8(oldcode);
+            done++;
+            started = true;
+        }
+        else
+        {
+            unsigned int newcode = source->GetBits(n_bits);
+            bitpos += n_bits;
+            if (newcode == 256)
+            {
+                source->SkipBits();
+                source->Skip((((bitpos - 1) + ((n_bits << 3) - (bitpos - 1 + (n_bits << 3)) % (n_bits << 3))) - bitpos) >> 3);
+                n_bits = 9;
+                free_entry = 256;
+                bitpos = 0;
+            }
+            else
+            {
+                if (newcode > free_entry)
+                {
+                    throw DataCorruption(__FILE__, __LINE__);
+                }
+                unsigned int c = newcode;
+                if (c >= free_entry)
+                {
+                    decodestack.push_back(lastbyte);
+                    c = oldcode;
+                }
+                while (c >= 256)
+                {
+                    decodestack.push_back(codetable[c].append);
+                    c = codetable[c].prefix;
+                }
+                decodestack.push_back(c);
+                lastbyte = c;
+                if (free_entry < 4096)
+                {
+                    codetable[free_entry].prefix = oldcode;
+                    codetable[free_entry].append = lastbyte;
+                    free_entry++;
+                    if ((free_entry >= (unsigned int)(1 << n_bits)) && (n_bits < 12))
+                    {
+                        n_bits++;
+                        bitpos = 0;
+                    }
+                }
+                oldcode = newcode;
+            }
+        }
+    }
+    return done;
+}
+
+unsigned int
+Decoder::DecodeLZSS(FileBuffer *result, const unsigned int n)
+{
+    unsigned int done = 0;
+    while (done < n)
+    {
+        if (pending)
+        {
+            // Overlapping matches repeat the bytes as they are produced
+            unsigned int len = MIN(pending, n - done);
+            unsigned int start = history.size();
+            for (unsigned int i = 0; i < len; i++)
+            {
+                history.push_back(history[matchpos++]);
+            }
+            result->PutData(history.data() + start, len);
+            pending -= len;
+            done += len;
+        }
+        else if (source->AtEnd())
+        {
+            break;
+        }
+        else
+        {
+            if (!mask)
+            {
+                code = source->GetUint8();
+                mask = 0x01;
+            }
+            if (code & mask)
+            {
+                uint8_t x = source->GetUint8();
+                history.push_back(x);
+                result->PutUint8(x);
+                done++;
+            }
+            else
+            {
+                matchpos = source->GetUint16LE();
+                pending = source->GetUint8() + 5;
+                if (matchpos >= history.size())
+                {
+                    throw DataCorruption(__FILE__, __LINE__);
+                }
+            }
+            mask <<= 1;
+        }
+    }
+    return done;
+}
+
+unsigned int
+Decoder::DecodeRLE(FileBuffer *result, const unsigned int n)
+{
+    unsigned int done = 0;
+    while (done < n)
+    {
+        if (pending)
+        {
+            unsigned int len = MIN(pending, n - done);
+            if (repeat)
+            {
+                result->PutData(value, len);
+            }
+            else
+            {
+                result->CopyFrom(source, len);
+            }
+            pending -= len;
+            done += len;
+        }
+        else if (source->AtEnd())
+        {
+            break;
+        }
+        else
+        {
+            uint8_t control = source->GetUint8();
+            repeat = (control & 0x80) != 0;
+            if (repeat)
+            {
+                value = source->GetUint8();
+            }
+            pending = control & 0x7f;
+        }
+    }
+    return done;
+}
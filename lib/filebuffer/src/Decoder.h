@@ -0,0 +1,69 @@
+/*
+ * This file is part of xBaK.
+ *
+ * xBaK is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * xBaK is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with xBaK.  If not, see <http://www.gnu.org/licenses/>.
+ *
+ * Copyright (C) Guido de Jong <guidoj@users.sf.net>
+ */
+
+#ifndef DECODER_H
+#define DECODER_H
+
+#include <vector>
+
+#include "FileBuffer.h"
+
+// Incremental counterpart of FileBuffer::Decompress*: each call to Decode fills
+// the result buffer from its cursor and the decoder resumes where it stopped.
+class Decoder
+{
+    private:
+        typedef struct _LZWEntry
+        {
+            uint16_t prefix;
+            uint8_t append;
+        } LZWEntry;
+
+        FileBuffer *source;
+        unsigned int method;
+        unsigned int remaining;
+        // A run (RLE) or a match (LZSS) that did not fit into the last result
+        unsigned int pending;
+        bool repeat;
+        uint8_t value;
+        // LZSS offsets refer to the whole output, so all of it is kept
+        std::vector<uint8_t> history;
+        unsigned int matchpos;
+        uint8_t code;
+        uint8_t mask;
+        std::vector<LZWEntry> codetable;
+        std::vector<uint8_t> decodestack;
+        unsigned int n_bits;
+        unsigned int free_entry;
+        unsigned int oldcode;
+        unsigned int lastbyte;
+        unsigned int bitpos;
+        bool started;
+        unsigned int DecodeLZW ( FileBuffer *result, const unsigned int n );
+        unsigned int DecodeLZSS ( FileBuffer *result, const unsigned int n );
+        unsigned int DecodeRLE ( FileBuffer *result, const unsigned int n );
+    public:
+        Decoder ( FileBuffer *src, const unsigned int method, const unsigned int n );
+        virtual ~Decoder();
+
+        unsigned int Decode ( FileBuffer *result );
+        unsigned int GetBytesLeft() const;
+};
+
+#endif
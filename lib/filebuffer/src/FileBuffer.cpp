@@ -19,7 +19,10 @@
 
 #include <iomanip>
 #include <iostream>
+#ifdef FILEBUFFER_BENCHMARKS
 #include <map>
+#endif
+#include <vector>
 #include <cstring>
 
 #include "SDL_endian.h"
@@ -34,19 +37,85 @@ FileBuffer::FileBuffer(const unsigned int n)
     memset(buffer, 0, n);
     current = buffer;
     size = n;
+    capacity = n;
     nextbit = 0;
+    owner = true;
+    readonly = false;
+    growable = false;
+}
+
+// A buffer that starts empty and grows as data is written past its end.
+// `n` is the initial capacity.
+FileBuffer::FileBuffer(const unsigned int n, const bool grow)
+{
+    buffer = new uint8_t[n];
+    memset(buffer, 0, n);
+    current = buffer;
+    size = grow ? 0 : n;
+    capacity = n;
+    nextbit = 0;
+    owner = true;
+    readonly = false;
+    growable = grow;
+}
+
+FileBuffer::FileBuffer(uint8_t *data, const unsigned int n, const bool ro)
+{
+    buffer = data;
+    current = buffer;
+    size = n;
+    capacity = n;
+    nextbit = 0;
+    owner = false;
+    readonly = ro;
+    growable = false;
 }
 
 FileBuffer::~FileBuffer()
 {
-    if (buffer)
+    if (buffer && owner)
     {
         delete[] buffer;
     }
 }
 
+void FileBuffer::CheckWritable() const
+{
+    if (readonly)
+    {
+        throw IOError(__FILE__, __LINE__, "(read-only buffer)");
+    }
+}
+
+// Make room for writing `n` bytes at the cursor. Growable buffers are extended
+// (doubling the capacity when it runs out), others are left to the caller's
+// bounds check.
+void FileBuffer::Reserve(const unsigned int n)
+{
+    CheckWritable();
+    if (!growable || (current + n <= buffer + size))
+    {
+        return;
+    }
+    unsigned int done = current - buffer;
+    unsigned int needed = done + n;
+    if (needed > capacity)
+    {
+        unsigned int newcapacity = MAX(capacity * 2, needed);
+        uint8_t *newbuffer = new uint8_t[newcapacity];
+        memcpy(newbuffer, buffer, size);
+        memset(newbuffer + size, 0, newcapacity - size);
+        delete[] buffer;
+        buffer = newbuffer;
+        current = buffer + done;
+        capacity = newcapacity;
+    }
+    size = needed;
+}
+
 void FileBuffer::CopyFrom(FileBuffer *buf, const unsigned int n)
 {
+    Reserve(n);
     if (buffer && n && (current + n <= buffer + size))
     {
         buf->GetData(current, n);
@@ -65,6 +134,7 @@ void FileBuffer::CopyTo(FileBuffer *buf, const unsigned int n)
 
 void FileBuffer::Fill(FileBuffer *buf)
 {
+    CheckWritable();
     if (buffer)
     {
         current = buffer;
@@ -74,6 +144,7 @@ void FileBuffer::Fill(FileBuffer *buf)
 
 void FileBuffer::Load(std::ifstream &ifs)
 {
+    CheckWritable();
     if (ifs.is_open())
     {
         current = buffer;
@@ -156,11 +227,16 @@ void FileBuffer::Seek(const unsigned int n)
     if ((current) && (n <= size))
     {
         current = buffer + n;
+        nextbit = 0;
     }
 }
 
 void FileBuffer::Skip(const int n)
 {
+    if (growable && (n > 0))
+    {
+        Reserve(n);
+    }
     if ((current) && (current + n <= buffer + size))
     {
         current += n;
@@ -176,65 +252,181 @@ void FileBuffer::SkipBits()
     }
 }
 
-typedef union _HashTableEntry
+const unsigned int LZW_CLEAR = 256;
+const unsigned int LZW_FIRST_FREE = 257;
+const unsigned int LZW_MAX_BITS = 12;
+const unsigned int LZW_MAX_CODES = 1 << LZW_MAX_BITS;
+
+// LZW dictionary keyed by (prefix code << 8) | appended byte, using open
+// addressing over a table twice the maximum number of codes.
+class LZWHashTable
 {
-    uint32_t code;
-    struct
-    {
-        uint16_t prefix;
-        uint8_t append;
-    } entry;
-} HashTableEntry;
+    private:
+        static const unsigned int BITS = LZW_MAX_BITS + 1;
+        static const uint32_t EMPTY = 0xffffffff;
+        uint32_t keys[1 << BITS];
+        uint16_t codes[1 << BITS];
+        static unsigned int Slot(const uint32_t key)
+        {
+            return (key * 2654435761u) >> (32 - BITS);
+        }
+    public:
+        LZWHashTable()
+        {
+            Clear();
+        }
+        void Clear()
+        {
+            memset(keys, 0xff, sizeof(keys));
+        }
+        bool Find(const uint32_t key, unsigned int &code) const
+        {
+            for (unsigned int i = Slot(key); keys[i] != EMPTY; i = (i + 1) & ((1 << BITS) - 1))
+            {
+                if (keys[i] == key)
+                {
+                    code = codes[i];
+                    return true;
+                }
+            }
+            return false;
+        }
+        void Insert(const uint32_t key, const unsigned int code)
+        {
+            unsigned int i = Slot(key);
+            while (keys[i] != EMPTY)
+            {
+                i = (i + 1) & ((1 << BITS) - 1);
+            }
+            keys[i] = key;
+            codes[i] = code;
+        }
+};
 
-unsigned int
-FileBuffer::CompressLZW(FileBuffer *result)
+#ifdef FILEBUFFER_BENCHMARKS
+// The same dictionary on top of std::map, only built for the LZW benchmark.
+class LZWMap
+{
+    private:
+        std::map<uint32_t, uint16_t> codes;
+    public:
+        void Clear()
+        {
+            codes.clear();
+        }
+        bool Find(const uint32_t key, unsigned int &code) const
+        {
+            std::map<uint32_t, uint16_t>::const_iterator it = codes.find(key);
+            if (it == codes.end())
+            {
+                return false;
+            }
+            code = it->second;
+            return true;
+        }
+        void Insert(const uint32_t key, const unsigned int code)
+        {
+            codes[key] = code;
+        }
+};
+#endif
+
+// Encode the rest of `src` so that DecompressLZW reproduces it. The encoder
+// mirrors the decoder's state (code width, next free code and the bit count
+// used to pad after a clear code) as it stands after reading each code.
+template <class Dictionary>
+static unsigned int
+EncodeLZW(FileBuffer *src, FileBuffer *result)
 {
+    const uint8_t *data = src->GetCurrent();
+    unsigned int n = src->GetBytesLeft();
+    src->Skip(n);
+    if (n == 0)
+    {
+        result->Rewind();
+        return 0;
+    }
+    Dictionary *dict = new Dictionary();
+    unsigned int n_bits = 9;
+    unsigned int free_entry = LZW_FIRST_FREE;
+    unsigned int bitpos = 0;
+    bool first = true;
+    unsigned int prefix = data[0];
+    uint32_t key = 0;
     try
     {
-        std::map<uint32_t, uint16_t> hashtable;
-        unsigned int n_bits = 9;
-        unsigned int free_entry = 257;
-        unsigned int bitpos = 0;
-        HashTableEntry hte;
-        hte.entry.prefix = GetUint8();
-        while (!AtEnd() && !result->AtEnd())
+        for (unsigned int i = 1; i <= n; i++)
         {
-            hte.entry.append = GetUint8();
-            std::map<uint32_t, uint16_t>::iterator it = hashtable.find(hte.code);
-            if (it == hashtable.end())
+            if (i < n)
+            {
+                unsigned int code;
+                key = (prefix << 8) | data[i];
+                if (dict->Find(key, code))
+                {
+                    prefix = code;
+                    continue;
+                }
+            }
+            result->PutBits(prefix, n_bits);
+            if (first)
+            {
+                // The decoder does not count the first code towards bitpos
+                first = false;
+            }
+            else
             {
-                result->PutBits(hte.entry.prefix, n_bits);
                 bitpos += n_bits;
-                hashtable.insert(std::pair<uint32_t, uint16_t>(hte.code, free_entry));
-                hte.entry.prefix = hte.entry.append;
-                free_entry++;
-                if (free_entry >= (unsigned int)(1 << n_bits))
+                if (free_entry < LZW_MAX_CODES)
                 {
-                    if (n_bits < 12)
+                    free_entry++;
+                    if ((free_entry >= (unsigned int)(1 << n_bits)) && (n_bits < LZW_MAX_BITS))
                     {
                         n_bits++;
-                    }
-                    else
-                    {
-                        hashtable.clear();
-                        free_entry = 256;
-                        result->PutBits(free_entry, n_bits);
-                        result->SkipBits();
-                        result->Skip((((bitpos - 1) + ((n_bits << 3) - (bitpos - 1 + (n_bits << 3)) % (n_bits << 3))) - bitpos) >> 3);
-                        n_bits = 9;
                         bitpos = 0;
                     }
                 }
             }
+            if (i == n)
+            {
+                break;
+            }
+            if (free_entry < LZW_MAX_CODES)
+            {
+                // The decoder adds this entry when it reads the next code
+                dict->Insert(key, free_entry);
+            }
             else
             {
-                hte.entry.prefix = it->second;
+                result->PutBits(LZW_CLEAR, n_bits);
+                bitpos += n_bits;
+                result->SkipBits();
+                result->Skip((((bitpos - 1) + ((n_bits << 3) - (bitpos - 1 + (n_bits << 3)) % (n_bits << 3))) - bitpos) >> 3);
+                dict->Clear();
+                n_bits = 9;
+                free_entry = LZW_CLEAR;
+                bitpos = 0;
             }
+            prefix = data[i];
         }
-        hashtable.clear();
-        unsigned int res = result->GetBytesDone();
-        result->Rewind();
-        return res;
+    }
+    catch (...)
+    {
+        delete dict;
+        throw;
+    }
+    delete dict;
+    result->SkipBits();
+    unsigned int res = result->GetBytesDone();
+    result->Rewind();
+    return res;
+}
+
+unsigned int
+FileBuffer::CompressLZW(FileBuffer *result)
+{
+    try
+    {
+        return EncodeLZW<LZWHashTable>(this, result);
     }
     catch (Exception &e)
     {
@@ -244,59 +436,112 @@ FileBuffer::CompressLZW(FileBuffer *result)
     return 0;
 }
 
+#ifdef FILEBUFFER_BENCHMARKS
+unsigned int
+FileBuffer::CompressLZWMap(FileBuffer *result)
+{
+    try
+    {
+        return EncodeLZW<LZWMap>(this, result);
+    }
+    catch (Exception &e)
+    {
+        e.Print("FileBuffer::CompressLZWMap");
+        throw;
+    }
+    return 0;
+}
+#endif
+
+const unsigned int LZSS_MIN_MATCH = 5;
+const unsigned int LZSS_MAX_MATCH = 0xff + LZSS_MIN_MATCH;
+const unsigned int LZSS_MAX_OFFSET = 0xffff;
+const unsigned int LZSS_HASH_BITS = 15;
+const unsigned int LZSS_MAX_CHAIN = 256;
+
+static inline unsigned int
+LZSSHash(const uint8_t *p)
+{
+    uint32_t x = p[0] | (p[1] << 8) | (p[2] << 16) | ((uint32_t)p[3] << 24);
+    return (x * 2654435761u) >> (32 - LZSS_HASH_BITS);
+}
+
 unsigned int
 FileBuffer::CompressLZSS(FileBuffer *result)
 {
     try
     {
+        // Back references are absolute offsets into the output, so only the
+        // first 64K positions can ever be referenced. They are indexed with
+        // hash chains keyed by the first four bytes of each position.
         uint8_t *data = GetCurrent();
-        uint8_t *curr = GetCurrent();
-        uint8_t *codeptr = result->GetCurrent();
-        uint8_t byte = GetUint8();
-        uint8_t code = 0;
+        unsigned int n = GetBytesLeft();
+        std::vector<int> head(1 << LZSS_HASH_BITS, -1);
+        std::vector<int> prev(MIN(n, LZSS_MAX_OFFSET + 1));
+        uint8_t *codeptr = 0;
         uint8_t mask = 0;
-        while (!AtEnd() && !result->AtEnd())
+        unsigned int pos = 0;
+        while (pos < n)
         {
             if (!mask)
             {
-                *codeptr = code;
                 codeptr = result->GetCurrent();
-                result->Skip(1);
-                code = 0;
+                result->PutUint8(0);
                 mask = 0x01;
             }
             unsigned int off = 0;
             unsigned int len = 0;
-            uint8_t *ptr = curr;
-            while (ptr > data)
+            if (pos + LZSS_MIN_MATCH <= n)
             {
-                ptr--;
-                if (*ptr == byte)
+                unsigned int maxlen = MIN(LZSS_MAX_MATCH, n - pos);
+                unsigned int chain = LZSS_MAX_CHAIN;
+                for (int cand = head[LZSSHash(data + pos)]; (cand >= 0) && chain; cand = prev[cand], chain--)
                 {
-                    off = ptr - data;
-                    len = 1;
-                    while ((curr + len < buffer + size) && (ptr[len] == curr[len]))
+                    // Matches must not overlap the current position
+                    unsigned int limit = MIN(maxlen, pos - cand);
+                    if ((limit <= len) || (data[cand + len] != data[pos + len]))
+                    {
+                        continue;
+                    }
+                    unsigned int l = 0;
+                    while ((l < limit) && (data[cand + l] == data[pos + l]))
+                    {
+                        l++;
+                    }
+                    if (l > len)
                     {
-                        len++;
+                        off = cand;
+                        len = l;
+                        if (len == maxlen)
+                        {
+                            break;
+                        }
                     }
                 }
             }
-            if (len < 5)
+            if (len < LZSS_MIN_MATCH)
             {
-                code |= mask;
-                result->PutUint8(byte);
+                *codeptr |= mask;
+                result->PutUint8(data[pos]);
+                len = 1;
             }
             else
             {
                 result->PutUint16LE(off);
-                result->PutUint8(len - 5);
-                Skip(len - 1);
+                result->PutUint8(len - LZSS_MIN_MATCH);
+            }
+            for (unsigned int end = pos + len; pos < end; pos++)
+            {
+                if ((pos <= LZSS_MAX_OFFSET) && (pos + LZSS_MIN_MATCH <= n))
+                {
+                    unsigned int h = LZSSHash(data + pos);
+                    prev[pos] = head[h];
+                    head[h] = pos;
+                }
             }
-            curr = GetCurrent();
-            byte = GetUint8();
             mask <<= 1;
         }
-        *codeptr = code;
+        Skip(n);
         unsigned int res = result->GetBytesDone();
         result->Rewind();
         return res;
@@ -309,95 +554,134 @@ FileBuffer::CompressLZSS(FileBuffer *result)
     return 0;
 }
 
+const unsigned int RLE_MAX_COUNT = 127;
+const unsigned int RLE_MIN_RUN = 4;
+
+static void PutRLELiteral(FileBuffer *result, uint8_t *data, unsigned int n)
+{
+    while (n > 0)
+    {
+        unsigned int count = MIN(n, RLE_MAX_COUNT);
+        result->PutUint8(count);
+        result->PutData(data, count);
+        data += count;
+        n -= count;
+    }
+}
+
+// Greedy single pass: runs of at least RLE_MIN_RUN equal bytes are encoded as
+// runs, everything in between as literals.
 unsigned int
 FileBuffer::CompressRLE(FileBuffer *result)
 {
     try
     {
-        uint8_t *skipptr = GetCurrent();
-        uint8_t byte = 0;
-        uint8_t next = GetUint8();
-        unsigned int count;
-        unsigned int skipped = 0;
-        while (!AtEnd() && !result->AtEnd())
+        uint8_t *end = buffer + size;
+        uint8_t *literal = current;
+        while (current < end)
         {
-            count = 1;
-            do
+            uint8_t *run = current + 1;
+            uint8_t *runend = current + MIN((unsigned int)(end - current), RLE_MAX_COUNT);
+            while ((run < runend) && (*run == *current))
             {
-                byte = next;
-                next = GetUint8();
-                count++;
-            } while (!AtEnd() && (next == byte));
-            if (next != byte)
+                run++;
+            }
+            unsigned int count = run - current;
+            if (count >= RLE_MIN_RUN)
             {
-                count--;
+                PutRLELiteral(result, literal, current - literal);
+                result->PutUint8(count | 0x80);
+                result->PutUint8(*current);
+                literal = run;
             }
-            if (count > 3)
+            current = run;
+        }
+        PutRLELiteral(result, literal, current - literal);
+        unsigned int res = result->GetBytesDone();
+        result->Rewind();
+        return res;
+    }
+    catch (Exception &e)
+    {
+        e.Print("FileBuffer::CompressRLE");
+        throw;
+    }
+    return 0;
+}
+
+// Smallest possible output. Working backwards, cost[i] is the size of the best
+// encoding of the data from i on. It never grows with i, so the best run from i
+// is the longest one, and the best literal ends at the j in the next
+// RLE_MAX_COUNT bytes with the smallest j + cost[j], kept at the front of a
+// monotonic queue. That makes it linear: only the last RLE_MAX_COUNT costs are
+// kept, and one control byte per input byte for the forward pass.
+const unsigned int RLE_WINDOW = RLE_MAX_COUNT + 1;
+
+unsigned int
+FileBuffer::CompressRLEOptimal(FileBuffer *result)
+{
+    try
+    {
+        uint8_t *data = current;
+        unsigned int n = GetBytesLeft();
+        std::vector<uint8_t> control(n);
+        unsigned int cost[RLE_WINDOW];
+        // Candidate literal ends, from the oldest (largest j) at first to the
+        // newest at last, with strictly increasing j + cost[j]
+        unsigned int ends[RLE_WINDOW];
+        unsigned int first = 0;
+        unsigned int last = 0;
+        cost[n % RLE_WINDOW] = 0;
+        unsigned int same = 0;
+        for (unsigned int i = n; i-- > 0;)
+        {
+            unsigned int j = i + 1;
+            unsigned int g = j + cost[j % RLE_WINDOW];
+            while ((last > first) &&
+                   (ends[(last - 1) % RLE_WINDOW] + cost[ends[(last - 1) % RLE_WINDOW] % RLE_WINDOW] >= g))
             {
-                if (skipped > 0)
-                {
-                    while (skipped > 0)
-                    {
-                        unsigned int n;
-                        if (skipped > 127)
-                        {
-                            n = 127;
-                        }
-                        else
-                        {
-                            n = skipped & 0x7f;
-                        }
-                        result->PutUint8(n);
-                        result->PutData(skipptr, n);
-                        skipped -= n;
-                        skipptr += n;
-                    }
-                }
-                while (count > 3)
-                {
-                    unsigned int n;
-                    if (count > 127)
-                    {
-                        n = 127;
-                    }
-                    else
-                    {
-                        n = count & 0x7f;
-                    }
-                    result->PutUint8(n | 0x80);
-                    result->PutUint8(byte);
-                    count -= n;
-                }
-                skipped = count;
-                skipptr = GetCurrent() - skipped - 1;
+                last--;
             }
-            else
+            ends[last++ % RLE_WINDOW] = j;
+            while (ends[first % RLE_WINDOW] > i + RLE_MAX_COUNT)
             {
-                skipped += count;
+                first++;
             }
+            unsigned int end = ends[first % RLE_WINDOW];
+            unsigned int best = 1 + (end - i) + cost[end % RLE_WINDOW];
+            control[i] = end - i;
+
+            same = ((j < n) && (data[i] == data[j])) ? same + 1 : 1;
+            unsigned int run = MIN(same, RLE_MAX_COUNT);
+            if ((run >= 2) && (2 + cost[(i + run) % RLE_WINDOW] < best))
+            {
+                best = 2 + cost[(i + run) % RLE_WINDOW];
+                control[i] = run | 0x80;
+            }
+            cost[i % RLE_WINDOW] = best;
         }
-        if (next != byte)
-        {
-            skipped++;
-        }
-        if (skipped > 0)
+        for (unsigned int i = 0; i < n;)
         {
-            Skip(-skipped);
-            while (skipped > 0)
+            unsigned int count = control[i] & 0x7f;
+            result->PutUint8(control[i]);
+            if (control[i] & 0x80)
+            {
+                result->PutUint8(data[i]);
+            }
+            else
             {
-                unsigned int n = skipped & 0x7f;
-                result->PutUint8(n);
-                result->CopyFrom(this, n);
-                skipped -= n;
+                result->PutData(data + i, count);
             }
+            i += count;
         }
+        current += n;
         unsigned int res = result->GetBytesDone();
         result->Rewind();
         return res;
     }
     catch (Exception &e)
     {
-        e.Print("FileBuffer::CompressRLE");
+        e.Print("FileBuffer::CompressRLEOptimal");
         throw;
     }
     return 0;
@@ -434,8 +718,14 @@ FileBuffer::DecompressLZW(FileBuffer *result)
 {
     try
     {
-        CodeTableEntry *codetable = new CodeTableEntry[4096];
-        uint8_t *decodestack = new uint8_t[4096];
+        if (result->AtEnd())
+        {
+            result->Rewind();
+            return 0;
+        }
+        std::vector<CodeTableEntry> codetable(4096);
+        std::vector<uint8_t> decodestackbuf(4096);
+        uint8_t *decodestack = decodestackbuf.data();
         uint8_t *stackptr = decodestack;
         unsigned int n_bits = 9;
         unsigned int free_entry = 257;
@@ -457,6 +747,10 @@ FileBuffer::DecompressLZW(FileBuffer *result)
             }
             else
             {
+                if (newcode > free_entry)
+                {
+                    throw DataCorruption(__FILE__, __LINE__);
+                }
                 unsigned int code = newcode;
                 if (code >= free_entry)
                 {
@@ -470,7 +764,7 @@ FileBuffer::DecompressLZW(FileBuffer *result)
                 }
                 *stackptr++ = code;
                 lastbyte = code;
-                while (stackptr > decodestack)
+                while ((stackptr > decodestack) && !result->AtEnd())
                 {
                     result->PutUint8(*--stackptr);
                 }
@@ -488,8 +782,6 @@ FileBuffer::DecompressLZW(FileBuffer *result)
                 oldcode = newcode;
             }
         }
-        delete[] decodestack;
-        delete[] codetable;
         unsigned int res = result->GetBytesDone();
         result->Rewind();
         return res;
@@ -525,7 +817,24 @@ FileBuffer::DecompressLZSS(FileBuffer *result)
             {
                 unsigned int off = GetUint16LE();
                 unsigned int len = GetUint8() + 5;
-                result->PutData(data + off, len);
+                len = MIN(len, result->GetBytesLeft());
+                unsigned int done = result->GetCurrent() - data;
+                if (off >= done)
+                {
+                    throw DataCorruption(__FILE__, __LINE__);
+                }
+                if (off + len <= done)
+                {
+                    result->PutData(data + off, len);
+                }
+                else
+                {
+                    // Overlapping match: repeat the bytes as they are produced
+                    for (unsigned int i = 0; i < len; i++)
+                    {
+                        result->PutUint8(data[off + i]);
+                    }
+                }
             }
             mask <<= 1;
         }
@@ -551,11 +860,12 @@ FileBuffer::DecompressRLE(FileBuffer *result)
             uint8_t control = GetUint8();
             if (control & 0x80)
             {
-                result->PutData(GetUint8(), control & 0x7f);
+                uint8_t x = GetUint8();
+                result->PutData(x, MIN(control & 0x7fu, result->GetBytesLeft()));
             }
             else
             {
-                result->CopyFrom(this, control);
+                result->CopyFrom(this, MIN((unsigned int)control, result->GetBytesLeft()));
             }
         }
         unsigned int res = result->GetBytesDone();
@@ -599,6 +909,16 @@ bool FileBuffer::AtEnd() const
     return (current >= buffer + size);
 }
 
+bool FileBuffer::IsReadOnly() const
+{
+    return readonly;
+}
+
+bool FileBuffer::IsGrowable() const
+{
+    return growable;
+}
+
 unsigned int
 FileBuffer::GetSize() const
 {
@@ -617,6 +937,12 @@ FileBuffer::GetBytesLeft() const
     return (buffer + size - current);
 }
 
+uint8_t *
+FileBuffer::GetBuffer() const
+{
+    return buffer;
+}
+
 uint8_t *
 FileBuffer::GetCurrent() const
 {
@@ -634,6 +960,20 @@ void FileBuffer::Rewind()
     current = buffer;
 }
 
+// Drop everything after the first `n` bytes, without reallocating.
+void FileBuffer::Truncate(const unsigned int n)
+{
+    if (n > size)
+    {
+        throw IndexOutOfRange(__FILE__, __LINE__, "", n);
+    }
+    size = n;
+    if (current > buffer + size)
+    {
+        current = buffer + size;
+    }
+}
+
 uint8_t
 FileBuffer::GetUint8()
 {
@@ -852,6 +1192,7 @@ void FileBuffer::PutSint32BE(const int32_t x)
 
 void FileBuffer::PutString(const std::string s)
 {
+    Reserve(s.length() + 1);
     if ((current) && (current + s.length() + 1 <= buffer + size))
     {
         strncpy((char *)current, s.c_str(), s.length() + 1);
@@ -865,6 +1206,7 @@ void FileBuffer::PutString(const std::string s)
 
 void FileBuffer::PutString(const std::string s, const unsigned int len)
 {
+    Reserve(len);
     if ((current) && (current + len <= buffer + size))
     {
         memset(current, 0, len);
@@ -879,6 +1221,7 @@ void FileBuffer::PutString(const std::string s, const unsigned int len)
 
 void FileBuffer::PutData(void *data, const unsigned int n)
 {
+    Reserve(n);
     if (current + n <= buffer + size)
     {
         memcpy(current, data, n);
@@ -892,6 +1235,7 @@ void FileBuffer::PutData(void *data, const unsigned int n)
 
 void FileBuffer::PutData(const uint8_t x, const unsigned int n)
 {
+    Reserve(n);
     if (current + n <= buffer + size)
     {
         memset(current, x, n);
@@ -905,6 +1249,7 @@ void FileBuffer::PutData(const uint8_t x, const unsigned int n)
 
 void FileBuffer::PutBits(const unsigned int x, const unsigned int n)
 {
+    Reserve((nextbit + n + 7) / 8);
     if (current + ((nextbit + n + 7) / 8) <= buffer + size)
     {
         for (unsigned int i = 0; i < n; i++)
@@ -930,3 +1275,31 @@ void FileBuffer::PutBits(const unsigned int x, const unsigned int n)
         throw BufferFull(__FILE__, __LINE__);
     }
 }
+
+void FileBuffer::PatchUint16LE(const unsigned int offset, const uint16_t x)
+{
+    CheckWritable();
+    if (offset + 2 <= size)
+    {
+        uint16_t xx = SDL_SwapLE16(x);
+        memcpy(buffer + offset, &xx, 2);
+    }
+    else
+    {
+        throw IndexOutOfRange(__FILE__, __LINE__, "", offset);
+    }
+}
+
+void FileBuffer::PatchUint32LE(const unsigned int offset, const uint32_t x)
+{
+    CheckWritable();
+    if (offset + 4 <= size)
+    {
+        uint32_t xx = SDL_SwapLE32(x);
+        memcpy(buffer + offset, &xx, 4);
+    }
+    else
+    {
+        throw IndexOutOfRange(__FILE__, __LINE__, "", offset);
+    }
+}
@@ -43,9 +43,17 @@ class FileBuffer
         uint8_t * buffer;
         uint8_t * current;
         unsigned int size;
+        unsigned int capacity;
         unsigned int nextbit;
+        bool owner;
+        bool readonly;
+        bool growable;
+        void CheckWritable() const;
+        void Reserve ( const unsigned int n );
     public:
         FileBuffer ( const unsigned int n );
+        FileBuffer ( const unsigned int n, const bool grow );
+        FileBuffer ( uint8_t *data, const unsigned int n, const bool ro );
         virtual ~FileBuffer();
 
         void Load ( std::ifstream &ifs );
@@ -56,13 +64,18 @@ class FileBuffer
         void CopyTo ( FileBuffer *buf, const unsigned int n );
         void Fill ( FileBuffer *buf );
         void Rewind();
+        void Truncate ( const unsigned int n );
         void Seek ( const unsigned int n );
         void Skip ( const int n );
 
         void SkipBits();
         unsigned int CompressLZW ( FileBuffer *result );
+#ifdef FILEBUFFER_BENCHMARKS
+        unsigned int CompressLZWMap ( FileBuffer *result );
+#endif
         unsigned int CompressLZSS ( FileBuffer *result );
         unsigned int CompressRLE ( FileBuffer *result );
+        unsigned int CompressRLEOptimal ( FileBuffer *result );
         unsigned int Compress ( FileBuffer *result, const unsigned int method );
         unsigned int DecompressLZW ( FileBuffer *result );
         unsigned int DecompressLZSS ( FileBuffer *result );
@@ -70,9 +83,12 @@ class FileBuffer
         unsigned int Decompress ( FileBuffer *result, const unsigned int method );
 
         bool AtEnd() const;
+        bool IsReadOnly() const;
+        bool IsGrowable() const;
         unsigned int GetSize() const;
         unsigned int GetBytesDone() const;
         unsigned int GetBytesLeft() const;
+        uint8_t * GetBuffer() const;
         uint8_t * GetCurrent() const;
         unsigned int GetNextBit() const;
 
@@ -106,6 +122,8 @@ class FileBuffer
         void PutData ( void * data, const unsigned int n );
         void PutData ( const uint8_t x, const unsigned int n );
         void PutBits ( const unsigned int x, const unsigned int n );
+        void PatchUint16LE ( const unsigned int offset, const uint16_t x );
+        void PatchUint32LE ( const unsigned int offset, const uint32_t x );
 };
 
 #endif
@@ -1,11 +1,142 @@
+from __future__ import annotations
+
+import functools
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Buffer, Callable, Iterable, Iterator
+from multiprocessing.shared_memory import SharedMemory
 from pathlib import Path
+from types import TracebackType
+from typing import Any, Literal
 
 import _filebuffer
 
+COMPRESSION_LZW = 0
+COMPRESSION_LZSS = 1
+COMPRESSION_RLE = 2
+
+
+@functools.cache
+def _struct(fmt: str) -> struct.Struct:
+    return struct.Struct(fmt)
+
 
 class FileBuffer:
+    _shared: SharedMemory | None = None
+
     def __init__(self, size: int) -> None:
         self._fb = _filebuffer.FileBuffer(size)
+        self._memory: Buffer | None = None
+
+    @classmethod
+    def growable(cls, capacity: int = 4096) -> FileBuffer:
+        """Create an empty buffer that grows as data is written past its end.
+
+        Use it for writers that do not know the output size up front, together with
+        `patch_uint16LE`/`patch_uint32LE` for size and offset fields. Growable
+        buffers do not export the buffer protocol, since growing moves the memory.
+        """
+        fb = cls.__new__(cls)
+        fb._fb = _filebuffer.FileBuffer(capacity, True)
+        fb._memory = None
+        return fb
+
+    @classmethod
+    def _from_memory(cls, memory: Buffer) -> FileBuffer:
+        """Create a buffer on top of `memory` without copying it."""
+        fb = cls.__new__(cls)
+        fb._fb = _filebuffer.FileBuffer(memory)
+        fb._memory = memory
+        return fb
+
+    @classmethod
+    def shared(cls, size: int) -> FileBuffer:
+        """Create a buffer in a new `multiprocessing.shared_memory` block.
+
+        Pickling the buffer only sends the block's name, so it can be passed to
+        process pool workers, which attach to the same memory instead of copying
+        it. The creating process must call `unlink` once all workers are done.
+        """
+        # Zero-sized blocks cannot be created
+        shared = SharedMemory(create=True, size=max(size, 1))
+        return cls._from_shared(shared, size)
+
+    @classmethod
+    def attach(cls, name: str, size: int) -> FileBuffer:
+        """Attach to a shared memory block created by `shared` in another process."""
+        # The creator owns the block, don't let this process' tracker unlink it
+        shared = SharedMemory(name=name, track=False)
+        return cls._from_shared(shared, size)
+
+    @classmethod
+    def _from_shared(cls, shared: SharedMemory, size: int) -> FileBuffer:
+        # The block may be rounded up to a whole number of pages
+        fb = cls._from_memory(shared.buf[:size])
+        fb._shared = shared
+        return fb
+
+    def shared_name(self) -> str | None:
+        """Return the name of the shared memory block, if the buffer is shared."""
+        return self._shared.name if self._shared is not None else None
+
+    def unlink(self) -> None:
+        """Destroy the shared memory block once no process needs it any more."""
+        if self._shared is None:
+            raise ValueError("The buffer is not in shared memory")
+        self._shared.unlink()
+
+    def __reduce__(self) -> tuple[Callable[[str, int], FileBuffer], tuple[str, int]]:
+        # The cursor is not sent: attached buffers start at offset 0
+        if self._shared is None:
+            raise TypeError("Only shared buffers can be pickled")
+        return FileBuffer.attach, (self._shared.name, self.size())
+
+    def __buffer__(self, flags: int) -> memoryview:
+        return memoryview(self._fb)
+
+    def __enter__(self) -> FileBuffer:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the underlying memory (and unmap it for mmap-backed buffers).
+
+        Shared buffers are detached from the block, which stays alive until it
+        is unlinked. Views of a mapped or shared buffer must be closed first.
+        """
+        self._fb = None
+        if isinstance(self._memory, mmap.mmap):
+            self._memory.close()
+        elif self._shared is not None:
+            assert isinstance(self._memory, memoryview)
+            self._memory.release()
+            self._shared.close()
+        self._memory = None
+
+    def readonly(self) -> bool:
+        return self._fb.IsReadOnly()
+
+    def view(self, offset: int, length: int) -> FileBuffer:
+        """Return a buffer over `length` bytes starting at `offset`, without copying.
+
+        The view has its own cursor and keeps this buffer's memory alive for as long
+        as it exists. Writes to a view are visible in this buffer and vice versa.
+        """
+        if offset < 0 or length < 0 or offset + length > self.size():
+            raise ValueError(
+                f"View {offset}:{offset + length} is out of range 0:{self.size()}"
+            )
+        return self._from_memory(memoryview(self._fb)[offset : offset + length])
 
     def size(self) -> int:
         return self._fb.GetSize()
@@ -22,33 +153,82 @@ class FileBuffer:
     def put_uint16LE(self, v: int) -> None:
         self._fb.PutUint16LE(v)
 
+    def patch_uint16LE(self, offset: int, v: int) -> None:
+        """Overwrite the value at `offset` without moving the cursor."""
+        self._fb.PatchUint16LE(offset, v)
+
+    def patch_uint32LE(self, offset: int, v: int) -> None:
+        """Overwrite the value at `offset` without moving the cursor."""
+        self._fb.PatchUint32LE(offset, v)
+
     def uint32LE(self) -> int:
         return self._fb.GetUint32LE()
 
     def put_uint32LE(self, v: int) -> None:
         self._fb.PutUint32LE(v)
 
+    def unpack(self, fmt: str) -> tuple[Any, ...]:
+        """Read one record described by a `struct` format, e.g. `"<4H"`."""
+        record = _struct(fmt)
+        return record.unpack(self._fb.GetData(record.size))
+
+    def unpack_many(self, fmt: str, count: int) -> list[tuple[Any, ...]]:
+        """Read `count` consecutive records described by a `struct` format."""
+        record = _struct(fmt)
+        return list(record.iter_unpack(self._fb.GetData(record.size * count)))
+
+    def read_array(self, typecode: str, count: int) -> array[int]:
+        """Read `count` little-endian integers into an `array.array` of `typecode`."""
+        items = array(typecode)
+        items.frombytes(self._fb.GetData(items.itemsize * count))
+        if sys.byteorder == "big":
+            items.byteswap()
+        return items
+
+    def pack(self, fmt: str, *values: object) -> None:
+        """Write one record described by a `struct` format."""
+        self._fb.PutData(_struct(fmt).pack(*values))
+
     def string(self, length: int) -> str:
         return self.read(length).rstrip(b"\x00").decode("cp1251")
 
     def put_string(self, v: str, length: int) -> None:
         self.write(v.encode(encoding="cp1251"))
-        self.write(bytes(0 for _ in range(length - len(v))))
+        self.write(bytes(length - len(v)))
 
     @classmethod
     def from_file(cls, path: Path) -> FileBuffer:
-        bytes = path.read_bytes()
-        fb = cls(len(bytes))
-        for b in bytes:
-            fb.put_uint8(b)
-        fb.seek(0)
+        size = path.stat().st_size
+        fb = cls(size)
+        with path.open("rb") as f:
+            if f.readinto(memoryview(fb._fb)) != size:
+                raise OSError(f"{path} was truncated while reading")
         return fb
 
+    @classmethod
+    def from_mmap(cls, path: Path) -> FileBuffer:
+        """Map the file read-only instead of copying it into memory.
+
+        Only the pages that are actually read are loaded from disk. Empty files
+        cannot be mapped and raise `ValueError`.
+        """
+        with path.open("rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"{path} is empty")
+            memory = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls._from_memory(memory)
+
     def to_file(self, path: Path) -> None:
-        offset = self.tell()
-        self.seek(0)
-        path.write_bytes(self.read())
-        self.seek(offset)
+        self.to_file_many(path, [self])
+
+    @staticmethod
+    def to_file_many(path: Path, buffers: Iterable[FileBuffer]) -> None:
+        """Write the buffers one after another into `path`, e.g. a header and a body.
+
+        The data goes to the file straight from the buffers' memory, and the
+        buffers' cursors are left unchanged.
+        """
+        _filebuffer.Save(os.fsencode(path), [buf._fb for buf in buffers])
 
     def seek(self, offset: int) -> None:
         self._fb.Seek(offset)
@@ -57,14 +237,13 @@ class FileBuffer:
         if size is None:
             size = self._fb.GetBytesLeft()
         assert size is not None
-        return bytes(self.uint8() for _ in range(size))
+        return self._fb.GetData(size)
 
     def skip(self, size: int) -> None:
         self._fb.Skip(size)
 
     def write(self, value: bytes) -> None:
-        for b in value:
-            self.put_uint8(b)
+        self._fb.PutData(value)
 
     def tell(self) -> int:
         return self._fb.GetBytesDone()
@@ -77,16 +256,63 @@ class FileBuffer:
         self._fb.DecompressRLE(fb._fb)
         return fb
 
-    def compressRLE(self) -> tuple[int, FileBuffer]:
+    def decompressRLE_into(self, dst: FileBuffer, max_out: int | None = None) -> int:
+        return self._decompress_into(self._fb.DecompressRLE, dst, max_out)
+
+    def _decompress_into(
+        self,
+        decompress: Callable[[object], int],
+        dst: FileBuffer,
+        max_out: int | None,
+    ) -> int:
+        """Decompress into `dst` at its cursor instead of a new buffer.
+
+        Decoding stops after `max_out` bytes or at the end of `dst`, whichever
+        comes first. Returns the number of bytes written; `dst`'s cursor is moved
+        past them.
+        """
+        out = dst._output_view(max_out)
+        written = decompress(out._fb)
+        dst.skip(written)
+        return written
+
+    def _output_view(self, max_out: int | None) -> FileBuffer:
+        # The decoders write through a view, which a growable buffer cannot give
+        if self._fb.IsGrowable():
+            raise ValueError("Cannot decompress into a growable buffer")
+        left = self.size() - self.tell()
+        return self.view(self.tell(), left if max_out is None else min(max_out, left))
+
+    def decoder(self, method: int, uncompressed_size: int) -> Decoder:
+        """Return a decoder that decompresses this buffer a chunk at a time."""
+        return Decoder(self, method, uncompressed_size)
+
+    def compressRLE(
+        self, mode: Literal["fast", "optimal"] = "fast"
+    ) -> tuple[int, FileBuffer]:
+        """Compress the whole buffer with RLE.
+
+        The `fast` mode is a single greedy pass. The `optimal` mode finds the
+        smallest possible output, also in linear time but two to three times
+        slower, and needs one extra byte of memory per input byte.
+        """
+        compress = {
+            "fast": self._fb.CompressRLE,
+            "optimal": self._fb.CompressRLEOptimal,
+        }[mode]
+        # Worst case: incompressible data, one control byte per 127 literals
+        return self._compress(compress, self.size() + self.size() // 127 + 1)
+
+    def _compress(
+        self, compress: Callable[[object], int], max_size: int
+    ) -> tuple[int, FileBuffer]:
         current = self.tell()
         self.seek(0)
-        uncompressed_size = self.size()
-        temp = FileBuffer(uncompressed_size)
-        compressed_size = self._fb.CompressRLE(temp._fb)
+        fb = FileBuffer(max_size)
+        compressed_size = compress(fb._fb)
         self.seek(current)
-        fb = FileBuffer(compressed_size)
-        fb.write(temp.read(compressed_size))
-        fb.seek(0)
+        # Keep the worst-case allocation rather than copying the result
+        fb._fb.Truncate(compressed_size)
         return compressed_size, fb
 
     def decompressLZW(self, uncompressed_size: int) -> FileBuffer:
@@ -94,7 +320,60 @@ class FileBuffer:
         self._fb.DecompressLZW(fb._fb)
         return fb
 
+    def decompressLZW_into(self, dst: FileBuffer, max_out: int | None = None) -> int:
+        return self._decompress_into(self._fb.DecompressLZW, dst, max_out)
+
+    def compressLZW(self) -> tuple[int, FileBuffer]:
+        # Worst case: a 12-bit code per byte, plus padding after each clear code
+        return self._compress(
+            self._fb.CompressLZW, self.size() * 3 // 2 + self.size() // 128 + 16
+        )
+
     def decompressLZSS(self, uncompressed_size: int) -> FileBuffer:
         fb = FileBuffer(uncompressed_size)
         self._fb.DecompressLZSS(fb._fb)
         return fb
+
+    def decompressLZSS_into(self, dst: FileBuffer, max_out: int | None = None) -> int:
+        return self._decompress_into(self._fb.DecompressLZSS, dst, max_out)
+
+    def compressLZSS(self) -> tuple[int, FileBuffer]:
+        # Worst case: every byte is a literal, plus one flag byte per 8 literals
+        return self._compress(self._fb.CompressLZSS, self.size() + self.size() // 8 + 1)
+
+
+class Decoder:
+    """Incremental decompression of `uncompressed_size` bytes from a buffer.
+
+    The source is consumed from its cursor on, so it must not be read elsewhere
+    until decoding is done. Output can be pulled into caller-provided buffers
+    with `decode_into` or as a series of `bytes` chunks.
+    """
+
+    def __init__(self, src: FileBuffer, method: int, uncompressed_size: int) -> None:
+        self._src = src
+        self._decoder = _filebuffer.Decoder(src._fb, method, uncompressed_size)
+
+    def bytes_left(self) -> int:
+        return self._decoder.GetBytesLeft()
+
+    def decode_into(self, dst: FileBuffer, max_out: int | None = None) -> int:
+        """Decode up to `max_out` bytes into `dst` at its cursor.
+
+        Returns the number of bytes written, which is 0 once all data is decoded.
+        """
+        out = dst._output_view(max_out)
+        written = self._decoder.Decode(out._fb)
+        dst.skip(written)
+        return written
+
+    def chunks(self, chunk_size: int = 65536) -> Iterator[bytes]:
+        chunk = FileBuffer(chunk_size)
+        while self.bytes_left():
+            chunk.seek(0)
+            written = self._decoder.Decode(chunk._fb)
+            if not written:
+                # The compressed data ended early
+                return
+            chunk.seek(0)
+            yield chunk.read(written)
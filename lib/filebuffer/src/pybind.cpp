@@ -1,19 +1,79 @@
+#include <cerrno>
+#include <fstream>
+#include <vector>
 #include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+#include "AllocationStats.h"
+#include "Decoder.h"
 #include "FileBuffer.h"
 #include "Exception.h"
 
 namespace py = pybind11;
 
+// Request a contiguous byte view of any object that supports the buffer protocol.
+static py::buffer_info RequestBytes(py::handle obj, bool writable)
+{
+    Py_buffer *view = new Py_buffer();
+    int flags = PyBUF_ND | PyBUF_FORMAT | (writable ? PyBUF_WRITABLE : 0);
+    if (PyObject_GetBuffer(obj.ptr(), view, flags) != 0)
+    {
+        delete view;
+        throw py::error_already_set();
+    }
+    return py::buffer_info(view);
+}
+
+// A FileBuffer over memory owned by another Python object (mmap, bytes, ...).
+// Holding the buffer view keeps the exporting object alive.
+class ExternalFileBuffer : public FileBuffer
+{
+private:
+    py::buffer_info info;
+public:
+    explicit ExternalFileBuffer(py::buffer_info &&i)
+        : FileBuffer((uint8_t *)i.ptr, i.size * i.itemsize, i.readonly)
+        , info(std::move(i))
+    {}
+};
+
 PYBIND11_MODULE(_filebuffer, m)
 {
-    py::class_<FileBuffer>(m, "FileBuffer")
+    py::register_exception_translator([](std::exception_ptr p)
+                                      {
+                                          try
+                                          {
+                                              if (p)
+                                              {
+                                                  std::rethrow_exception(p);
+                                              }
+                                          }
+                                          catch (const Exception &e)
+                                          {
+                                              PyErr_SetString(PyExc_RuntimeError, e.What().c_str());
+                                          } });
+
+    py::class_<FileBuffer>(m, "FileBuffer", py::buffer_protocol())
         .def(py::init<const unsigned int>())
+        .def(py::init<const unsigned int, const bool>())
+        .def(py::init([](py::buffer data)
+                      { return (FileBuffer *)new ExternalFileBuffer(RequestBytes(data, false)); }))
+        .def_buffer([](FileBuffer &b)
+                    {
+                        // Growing reallocates the memory, which would leave exported views dangling
+                        if (b.IsGrowable())
+                        {
+                            throw py::buffer_error("Growable buffers do not support the buffer protocol");
+                        }
+                        return py::buffer_info(b.GetBuffer(), (py::ssize_t)b.GetSize(), b.IsReadOnly()); })
         .def("Seek", &FileBuffer::Seek)
         .def("Skip", &FileBuffer::Skip)
+        .def("Truncate", &FileBuffer::Truncate)
         .def("GetBytesDone", &FileBuffer::GetBytesDone)
         .def("GetBytesLeft", &FileBuffer::GetBytesLeft)
         .def("AtEnd", &FileBuffer::AtEnd)
         .def("GetSize", &FileBuffer::GetSize)
+        .def("IsReadOnly", &FileBuffer::IsReadOnly)
+        .def("IsGrowable", &FileBuffer::IsGrowable)
 
         .def("GetUint8", &FileBuffer::GetUint8)
         .def("GetUint16LE", &FileBuffer::GetUint16LE)
@@ -25,6 +85,15 @@ PYBIND11_MODULE(_filebuffer, m)
         .def("GetSint16BE", &FileBuffer::GetSint16BE)
         .def("GetSint32LE", &FileBuffer::GetSint32LE)
         .def("GetSint32BE", &FileBuffer::GetSint32BE)
+        .def("GetData", [](FileBuffer &b, const unsigned int n)
+             {
+                 if (n > b.GetBytesLeft())
+                 {
+                     throw BufferEmpty(__FILE__, __LINE__);
+                 }
+                 py::bytes data((const char *)b.GetCurrent(), n);
+                 b.Skip(n);
+                 return data; })
 
         .def("PutUint8", &FileBuffer::PutUint8)
         .def("PutUint16LE", &FileBuffer::PutUint16LE)
@@ -36,17 +105,94 @@ PYBIND11_MODULE(_filebuffer, m)
         .def("PutSint16BE", &FileBuffer::PutSint16BE)
         .def("PutSint32LE", &FileBuffer::PutSint32LE)
         .def("PutSint32BE", &FileBuffer::PutSint32BE)
+        .def("PatchUint16LE", &FileBuffer::PatchUint16LE)
+        .def("PatchUint32LE", &FileBuffer::PatchUint32LE)
+        .def("PutData", [](FileBuffer &b, py::buffer data)
+             {
+                 py::buffer_info info = RequestBytes(data, false);
+                 b.PutData(info.ptr, info.size * info.itemsize); })
 
+        // The codecs only touch the two buffers, so other Python threads can run
+        // while they work. A buffer must not be used by two threads at once.
         .def("DecompressRLE", [](FileBuffer &b, FileBuffer &result)
-             { b.DecompressRLE(&result); })
+             { return b.DecompressRLE(&result); }, py::call_guard<py::gil_scoped_release>())
         .def("CompressRLE", [](FileBuffer &b, FileBuffer &result)
-             { return b.CompressRLE(&result); })
+             { return b.CompressRLE(&result); }, py::call_guard<py::gil_scoped_release>())
+        .def("CompressRLEOptimal", [](FileBuffer &b, FileBuffer &result)
+             { return b.CompressRLEOptimal(&result); }, py::call_guard<py::gil_scoped_release>())
 
         .def("DecompressLZW", [](FileBuffer &b, FileBuffer &result)
-             { b.DecompressLZW(&result); })
+             { return b.DecompressLZW(&result); }, py::call_guard<py::gil_scoped_release>())
+        .def("CompressLZW", [](FileBuffer &b, FileBuffer &result)
+             { return b.CompressLZW(&result); }, py::call_guard<py::gil_scoped_release>())
+#ifdef FILEBUFFER_BENCHMARKS
+        .def("CompressLZWMap", [](FileBuffer &b, FileBuffer &result)
+             { return b.CompressLZWMap(&result); }, py::call_guard<py::gil_scoped_release>())
+#endif
 
         .def("DecompressLZSS", [](FileBuffer &b, FileBuffer &result)
-             { b.DecompressLZSS(&result); })
+             { return b.DecompressLZSS(&result); }, py::call_guard<py::gil_scoped_release>())
+        .def("CompressLZSS", [](FileBuffer &b, FileBuffer &result)
+             { return b.CompressLZSS(&result); }, py::call_guard<py::gil_scoped_release>())
 
         ;
+
+    // Write the buffers one after another straight from their memory. Failures,
+    // including those only seen when the stream is flushed on close, are raised
+    // as OSError once the GIL is held again.
+    m.def("Save", [](const std::string &path, const std::vector<FileBuffer *> &buffers)
+          {
+              std::ofstream ofs(path, std::ios::binary | std::ios::trunc);
+              if (!ofs.is_open())
+              {
+                  PyErr_SetFromErrnoWithFilename(PyExc_OSError, path.c_str());
+                  throw py::error_already_set();
+              }
+              int error = 0;
+              {
+                  py::gil_scoped_release release;
+                  for (FileBuffer *b : buffers)
+                  {
+                      unsigned int offset = b->GetBytesDone();
+                      try
+                      {
+                          b->Save(ofs);
+                      }
+                      catch (IOError &)
+                      {
+                          b->Seek(offset);
+                          break;
+                      }
+                      b->Seek(offset);
+                  }
+                  if (!ofs.fail())
+                  {
+                      ofs.close();
+                  }
+                  if (ofs.fail())
+                  {
+                      error = errno ? errno : EIO;
+                  }
+              }
+              if (error)
+              {
+                  errno = error;
+                  PyErr_SetFromErrnoWithFilename(PyExc_OSError, path.c_str());
+                  throw py::error_already_set();
+              } });
+
+#ifdef FILEBUFFER_BENCHMARKS
+    m.def("ResetAllocationStats", &ResetAllocationStats);
+    m.def("GetAllocationStats", []()
+          {
+              AllocationStats stats = GetAllocationStats();
+              return py::make_tuple(stats.allocations, stats.peak); });
+#endif
+
+    py::class_<Decoder>(m, "Decoder")
+        // The decoder reads from the source buffer, so it must outlive the decoder
+        .def(py::init<FileBuffer *, const unsigned int, const unsigned int>(), py::keep_alive<1, 2>())
+        .def("Decode", [](Decoder &d, FileBuffer &result)
+             { return d.Decode(&result); }, py::call_guard<py::gil_scoped_release>())
+        .def("GetBytesLeft", &Decoder::GetBytesLeft);
 }
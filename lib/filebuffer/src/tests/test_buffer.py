@@ -0,0 +1,189 @@
+import errno
+import pickle
+from pathlib import Path
+
+import pytest
+from filebuffer import FileBuffer
+
+
+def test_read_write() -> None:
+    buf = FileBuffer(8)
+    buf.write(b"abc")
+    buf.put_uint8(0x64)
+    buf.write(bytearray(b"efgh"))
+    assert buf.at_end()
+
+    buf.seek(2)
+    assert buf.read(3) == b"cde"
+    assert buf.read() == b"fgh"
+    assert memoryview(buf._fb).tobytes() == b"abcdefgh"
+
+
+def test_file_round_trip(tmp_path: Path) -> None:
+    data = bytes(range(256)) * 100
+    src = tmp_path / "src.bin"
+    src.write_bytes(data)
+
+    buf = FileBuffer.from_file(src)
+    assert buf.size() == len(data)
+    assert buf.tell() == 0
+    assert buf.uint32LE() == 0x03020100
+
+    dest = tmp_path / "dest.bin"
+    buf.to_file(dest)
+    assert dest.read_bytes() == data
+    assert buf.tell() == 4
+
+
+def test_mmap(tmp_path: Path) -> None:
+    path = tmp_path / "archive.bin"
+    path.write_bytes(b"\x01\x00\x00\x00NAME\x00\x00payload")
+
+    with FileBuffer.from_mmap(path) as buf:
+        assert buf.readonly()
+        assert buf.size() == 17
+        assert buf.uint32LE() == 1
+        assert buf.string(6) == "NAME"
+        buf.seek(10)
+        assert buf.read() == b"payload"
+        with pytest.raises(RuntimeError, match="read-only"):
+            buf.put_uint8(0)
+
+    # The mapping is released on close, so the file can be replaced
+    path.write_bytes(b"")
+    with pytest.raises(ValueError, match="is empty"):
+        FileBuffer.from_mmap(path)
+
+
+def test_view() -> None:
+    buf = FileBuffer(8)
+    buf.write(b"abcdefgh")
+
+    view = buf.view(2, 4)
+    assert view.size() == 4
+    assert view.tell() == 0
+    assert view.read() == b"cdef"
+
+    view.seek(0)
+    view.put_uint8(ord("C"))
+    buf.seek(0)
+    assert buf.read() == b"abCdefgh"
+
+    with pytest.raises(ValueError):
+        buf.view(6, 4)
+
+    # The view keeps the parent memory alive
+    del buf
+    view.seek(0)
+    assert view.read() == b"Cdef"
+    assert bytes(view) == b"Cdef"
+
+
+def test_growable() -> None:
+    buf = FileBuffer.growable(4)
+    assert buf.size() == 0
+
+    buf.put_uint32LE(0)
+    buf.write(b"x" * 10)
+    buf.skip(2)
+    buf.put_uint16LE(0x4241)
+    assert buf.size() == 18
+    buf.patch_uint32LE(0, buf.size())
+    buf.patch_uint16LE(4, 0x5958)
+    assert buf.tell() == 18
+
+    buf.seek(0)
+    assert buf.uint32LE() == 18
+    assert buf.read() == b"XY" + b"x" * 8 + b"\x00\x00AB"
+
+    with pytest.raises(RuntimeError):
+        buf.patch_uint32LE(16, 0)
+    with pytest.raises(BufferError):
+        memoryview(buf._fb)
+
+    # Writing in the middle does not move the end
+    buf.seek(2)
+    buf.put_uint8(0)
+    assert buf.size() == 18
+
+
+def test_pack_unpack() -> None:
+    buf = FileBuffer(4 + 2 + 3 * 4)
+    buf.pack("<I2s", 0x01020304, b"xy")
+    for i in range(3):
+        buf.pack("<2H", i, i * 256)
+    assert buf.at_end()
+
+    buf.seek(0)
+    assert buf.unpack("<I2s") == (0x01020304, b"xy")
+    assert buf.unpack_many("<2H", 3) == [(0, 0), (1, 256), (2, 512)]
+    assert buf.unpack_many("<2H", 0) == []
+
+    buf.seek(buf.size() - 2)
+    with pytest.raises(RuntimeError):
+        buf.unpack("<I")
+
+
+def test_read_array() -> None:
+    buf = FileBuffer(7)
+    buf.write(b"\x01\x00\x02\x01\xff\xfe\x07")
+    buf.seek(0)
+
+    offsets = buf.read_array("H", 2)
+    assert offsets.typecode == "H"
+    assert list(offsets) == [1, 0x0102]
+    assert list(buf.read_array("B", 3)) == [0xFF, 0xFE, 0x07]
+    assert len(buf.read_array("I", 0)) == 0
+    with pytest.raises(RuntimeError):
+        buf.read_array("H", 1)
+
+
+def test_shared() -> None:
+    with FileBuffer.shared(6) as buf:
+        try:
+            assert buf.size() == 6
+            buf.write(b"abc")
+
+            # Pickling attaches to the same memory instead of copying it
+            with pickle.loads(pickle.dumps(buf)) as attached:
+                assert attached.shared_name() == buf.shared_name()
+                assert attached.tell() == 0
+                assert attached.read(3) == b"abc"
+                attached.write(b"def")
+
+            buf.seek(0)
+            assert buf.read() == b"abcdef"
+        finally:
+            buf.unlink()
+
+    with pytest.raises(TypeError):
+        pickle.dumps(FileBuffer(1))
+
+
+def test_to_file_many(tmp_path: Path) -> None:
+    header = FileBuffer.growable()
+    header.put_uint32LE(3)
+    body = FileBuffer(3)
+    body.write(b"abc")
+
+    path = tmp_path / "out.bin"
+    FileBuffer.to_file_many(path, [header, body])
+    assert path.read_bytes() == b"\x03\x00\x00\x00abc"
+    assert header.tell() == 4
+    assert body.tell() == 3
+
+    with pytest.raises(FileNotFoundError):
+        body.to_file(tmp_path / "missing" / "out.bin")
+
+
+@pytest.mark.skipif(not Path("/dev/full").exists(), reason="needs /dev/full")
+@pytest.mark.parametrize("size", [100, 10_000_000])
+def test_to_file_write_error(size: int) -> None:
+    # Small writes only fail when the stream is flushed on close
+    buf = FileBuffer(size)
+    buf.seek(3)
+    with pytest.raises(OSError) as exc_info:
+        buf.to_file(Path("/dev/full"))
+    assert exc_info.value.errno == errno.ENOSPC
+    assert exc_info.value.filename == "/dev/full"
+    assert buf.tell() == 3
@@ -1,4 +1,33 @@
-from filebuffer import FileBuffer
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+
+import pytest
+from filebuffer import (
+    COMPRESSION_LZSS,
+    COMPRESSION_LZW,
+    COMPRESSION_RLE,
+    FileBuffer,
+)
+
+
+def _buffer(data: bytes) -> FileBuffer:
+    buf = FileBuffer(len(data))
+    buf.write(data)
+    buf.seek(0)
+    return buf
+
+
+_rnd = random.Random(0)
+SAMPLES = [
+    b"",
+    b"a",
+    b"aaaaa12345",
+    b"\x00" * 1000,
+    bytes(range(256)) * 300,
+    _rnd.randbytes(5000),
+    bytes(_rnd.choice(b"\x00\x00\x00\x07\x0f") for _ in range(100_000)),
+]
 
 
 def test_rle() -> None:
@@ -10,3 +39,164 @@ def test_rle() -> None:
 
     uncompressed = compressed_buf.decompressRLE(10)
     assert uncompressed.read() == b"aaaaa12345"
+
+
+def test_rle_threads() -> None:
+    rnd = random.Random(0)
+    samples = [
+        bytes(rnd.choice(b"\x00\x00\x00\x07") for _ in range(rnd.randint(1, 50_000)))
+        for _ in range(16)
+    ]
+
+    def round_trip(data: bytes) -> bytes:
+        buf = FileBuffer(len(data))
+        buf.write(data)
+        _, compressed_buf = buf.compressRLE()
+        return compressed_buf.decompressRLE(len(data)).read()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(round_trip, samples * 8))
+
+    assert results == samples * 8
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+@pytest.mark.parametrize("mode", ["fast", "optimal"])
+def test_rle_samples(data: bytes, mode: Literal["fast", "optimal"]) -> None:
+    compressed_size, compressed_buf = _buffer(data).compressRLE(mode)
+    assert compressed_buf.size() == compressed_size
+    assert compressed_buf.decompressRLE(len(data)).read() == data
+
+
+def test_rle_optimal() -> None:
+    # A short run between literals is only worth encoding at the edges
+    data = b"abcXXXdefYYY" + bytes(range(200)) + b"\x00" * 300
+    fast_size, _ = _buffer(data).compressRLE("fast")
+    optimal_size, compressed_buf = _buffer(data).compressRLE("optimal")
+    assert optimal_size <= fast_size
+    assert compressed_buf.decompressRLE(len(data)).read() == data
+
+    for data in SAMPLES:
+        assert (
+            _buffer(data).compressRLE("optimal")[0]
+            <= _buffer(data).compressRLE("fast")[0]
+        )
+
+
+def _smallest_rle_size(data: bytes) -> int:
+    # Try every run and literal length at every position
+    best = [0] * (len(data) + 1)
+    for i in reversed(range(len(data))):
+        candidates = [
+            1 + length + best[i + length]
+            for length in range(1, min(len(data) - i, 127) + 1)
+        ]
+        for length in range(1, min(len(data) - i, 127) + 1):
+            if data[i + length - 1] != data[i]:
+                break
+            candidates.append(2 + best[i + length])
+        best[i] = min(candidates)
+    return best[0]
+
+
+def test_rle_optimal_is_smallest() -> None:
+    rnd = random.Random(1)
+    samples = [b"", b"a", b"ab", b"aa", b"\x00" * 127, b"\x00" * 128, b"\x00" * 300]
+    for _ in range(100):
+        alphabet = rnd.randbytes(rnd.randint(1, 4))
+        samples.append(
+            b"".join(
+                bytes([rnd.choice(alphabet)]) * rnd.choice((1, 1, 2, 3, 5, 130))
+                for _ in range(rnd.randint(0, 30))
+            )
+        )
+    for data in samples:
+        optimal_size, compressed_buf = _buffer(data).compressRLE("optimal")
+        assert optimal_size == _smallest_rle_size(data), data
+        assert compressed_buf.decompressRLE(len(data)).read() == data
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+def test_lzss(data: bytes) -> None:
+    compressed_size, compressed_buf = _buffer(data).compressLZSS()
+    assert compressed_buf.size() == compressed_size
+
+    uncompressed = compressed_buf.decompressLZSS(len(data))
+    assert uncompressed.read() == data
+
+
+def test_lzss_overlapping_match() -> None:
+    # "ab" literals followed by a back reference to offset 0 that overlaps itself
+    compressed_buf = _buffer(b"\x03ab\x00\x00\x03")
+    assert compressed_buf.decompressLZSS(10).read() == b"ababababab"
+
+
+@pytest.mark.parametrize(
+    "data", [*SAMPLES, _rnd.randbytes(200_000), b"\x00" * 1_000_000]
+)
+def test_lzw(data: bytes) -> None:
+    # Random data fills the dictionary several times and exercises clear codes
+    compressed_size, compressed_buf = _buffer(data).compressLZW()
+    assert compressed_buf.size() == compressed_size
+
+    uncompressed = compressed_buf.decompressLZW(len(data))
+    assert uncompressed.read() == data
+
+
+CODECS = [
+    ("compressRLE", "decompressRLE_into", COMPRESSION_RLE),
+    ("compressLZW", "decompressLZW_into", COMPRESSION_LZW),
+    ("compressLZSS", "decompressLZSS_into", COMPRESSION_LZSS),
+]
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+@pytest.mark.parametrize(("compress", "decompress_into", "_"), CODECS)
+def test_decompress_into(
+    data: bytes, compress: str, decompress_into: str, _: int
+) -> None:
+    _, compressed_buf = getattr(_buffer(data), compress)()
+
+    # Decoding stops after `max_out` bytes, even in the middle of a run or match
+    dst = FileBuffer(len(data) + 2)
+    dst.skip(1)
+    max_out = len(data) // 3
+    assert getattr(compressed_buf, decompress_into)(dst, max_out) == max_out
+    assert dst.tell() == 1 + max_out
+    dst.seek(1)
+    assert dst.read(max_out) == data[:max_out]
+
+    compressed_buf.seek(0)
+    dst.seek(1)
+    assert getattr(compressed_buf, decompress_into)(dst, len(data)) == len(data)
+    dst.seek(1)
+    assert dst.read(len(data)) == data
+
+
+@pytest.mark.parametrize(("compress", "decompress_into", "method"), CODECS)
+def test_decompress_into_growable(
+    compress: str, decompress_into: str, method: int
+) -> None:
+    _, compressed_buf = getattr(_buffer(b"aaaaa12345"), compress)()
+    with pytest.raises(ValueError, match="growable"):
+        getattr(compressed_buf, decompress_into)(FileBuffer.growable())
+    with pytest.raises(ValueError, match="growable"):
+        compressed_buf.decoder(method, 10).decode_into(FileBuffer.growable())
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+@pytest.mark.parametrize(("compress", "_", "method"), CODECS)
+def test_decoder(data: bytes, compress: str, _: str, method: int) -> None:
+    _, compressed_buf = getattr(_buffer(data), compress)()
+
+    decoder = compressed_buf.decoder(method, len(data))
+    assert b"".join(decoder.chunks(chunk_size=7)) == data
+    assert decoder.bytes_left() == 0
+
+    compressed_buf.seek(0)
+    decoder = compressed_buf.decoder(method, len(data))
+    dst = FileBuffer(len(data))
+    while decoder.decode_into(dst, 1000):
+        pass
+    dst.seek(0)
+    assert dst.read() == data
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 import os
-from collections.abc import Iterable
+import re
+from collections.abc import Iterable, MutableSequence, Sequence
 from dataclasses import dataclass, field
-from io import BytesIO
 from pathlib import Path
+from typing import ClassVar, overload
 
 from cyclopts import App
 from filebuffer import FileBuffer
@@ -16,9 +17,17 @@ app = App(name="book", help="Operations on the book files")
 
 
 @app.command(name="display")
-def display_command(book_path: Path) -> None:
-    """Display the book."""
-    display_book(book_path)
+def display_command(book_path: Path, *, page: int | None = None) -> None:
+    """Display the book.
+
+    Parameters
+    ----------
+    book_path
+        Path to the book file.
+    page
+        Display only this page, counting from 1.
+    """
+    display_book(book_path, page)
 
 
 @app.command(name="copy")
@@ -39,20 +48,25 @@ def import_command(bok_dir: Path, imported_dir: Path, csv_path: Path) -> None:
     import_csv(bok_dir, imported_dir, csv_path)
 
 
-def display_book(book_path: Path) -> None:
+def display_book(book_path: Path, page_num: int | None = None) -> None:
     print(book_path)
 
-    book = Book.from_file(book_path)
+    # Only the displayed pages are parsed
+    book = Book.open(book_path)
+    if page_num is not None and not 1 <= page_num <= len(book.pages):
+        raise ValueError(f"The book has {len(book.pages)} pages, not {page_num}")
+    numbers = range(1, len(book.pages) + 1) if page_num is None else [page_num]
 
-    for page_num, page in enumerate(book.pages, 1):
-        print(f"Page {page_num}")
+    for number in numbers:
+        page = book.pages[number - 1]
+        print(f"Page {number}")
         print("===========")
         for text_block in page.text_blocks:
             print(text_block.text)
 
 
 def copy_book(src: Path, dest: Path) -> None:
-    book = Book.from_file(src)
+    book = Book.open(src)
     dest_dir = dest.parent
     dest_dir.mkdir(parents=True, exist_ok=True)
     book.to_file(dest)
@@ -108,6 +122,8 @@ def import_csv(bok_dir: Path, imported_dir: Path, csv_path: Path) -> None:
 
 @dataclass
 class ImageInfo:
+    FORMAT: ClassVar[str] = "<4H"
+
     x_pos: int
     y_pos: int
     id: int
@@ -118,25 +134,25 @@ class ImageInfo:
         return 4 * 2
 
     def write(self, buf: FileBuffer) -> None:
-        buf.put_uint16LE(self.x_pos)
-        buf.put_uint16LE(self.y_pos)
-        buf.put_uint16LE(self.id)
-        buf.put_uint16LE(self.flag)
+        buf.pack(self.FORMAT, self.x_pos, self.y_pos, self.id, self.flag)
 
     @classmethod
     def from_buf(cls, buf: FileBuffer) -> ImageInfo:
-        return ImageInfo(
-            x_pos=buf.uint16LE(),
-            y_pos=buf.uint16LE(),
-            id=buf.uint16LE(),
-            flag=buf.uint16LE(),
-        )
+        return cls(*buf.unpack(cls.FORMAT))
 
 
 ITALICS: dict[str, bytes] = {
     "\\I": bytes.fromhex("F400000000000000000500"),
     "\\i": bytes.fromhex("F400000000000000000100"),
 }
+ITALIC_PLACEHOLDERS = {marker: text.encode("ascii") for text, marker in ITALICS.items()}
+# Both directions are translated in a single pass over the text
+_ITALIC_TEXT_RE = re.compile(
+    b"|".join(re.escape(p) for p in ITALIC_PLACEHOLDERS.values())
+)
+_ITALIC_MARKER_RE = re.compile(b"|".join(re.escape(m) for m in ITALICS.values()))
+# A paragraph ends where the next one starts, or at the end of the page
+_PARAGRAPH_END_RE = re.compile(rb"[\xf0\xf1]")
 
 
 @dataclass
@@ -144,6 +160,10 @@ class TextInfo:
     paragraph: bool
     skips: list[bytes]
     text: str = ""
+    # The text last encoded, and its encoding
+    _encoded: tuple[str, bytes] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     @property
     def size(self) -> int:
@@ -152,16 +172,20 @@ class TextInfo:
 
     @property
     def bytes(self) -> bytes:
-        assert self.text.startswith("\\i") or self.text.startswith("\\I")
-        byte_string = self.text.encode("ascii")
-        for placeholder, replacement in ITALICS.items():
-            byte_string = byte_string.replace(placeholder.encode("ascii"), replacement)
-        return byte_string
+        if self._encoded is None or self._encoded[0] != self.text:
+            assert self.text.startswith("\\i") or self.text.startswith("\\I")
+            encoded = _ITALIC_TEXT_RE.sub(
+                lambda match: ITALICS[match[0].decode("ascii")],
+                self.text.encode("ascii"),
+            )
+            self._encoded = (self.text, encoded)
+        return self._encoded[1]
 
     @bytes.setter
     def bytes(self, byte_string: bytes) -> None:
-        for replacement, placeholder in ITALICS.items():
-            byte_string = byte_string.replace(placeholder, replacement.encode("ascii"))
+        byte_string = _ITALIC_MARKER_RE.sub(
+            lambda match: ITALIC_PLACEHOLDERS[match[0]], byte_string
+        )
         assert b"\xf2" not in byte_string
         assert b"\xf3" not in byte_string
         self.text = byte_string.decode("ascii")
@@ -172,8 +196,23 @@ class TextInfo:
         buf.write(self.bytes)
 
 
+def _buffer_data(buf: FileBuffer) -> memoryview:
+    """Return the contents of `buf`, without copying them where possible."""
+    try:
+        return memoryview(buf)
+    except BufferError:
+        # Growable buffers cannot be viewed, as their memory may still move
+        current = buf.tell()
+        buf.seek(0)
+        data = memoryview(buf.read())
+        buf.seek(current)
+        return data
+
+
 @dataclass
 class PageData:
+    HEADER_FORMAT: ClassVar[str] = "<7H2s5H30s"
+
     x_pos: int
     y_pos: int
     width: int
@@ -213,30 +252,48 @@ class PageData:
         )
 
     @classmethod
-    def from_buf(cls, buf: FileBuffer) -> PageData:
-        skips: list[bytes] = []
-        x_pos = buf.uint16LE()
-        y_pos = buf.uint16LE()
-        width = buf.uint16LE()
-        height = buf.uint16LE()
-        number = buf.uint16LE()
-        id = buf.uint16LE()
-        prev_id = buf.uint16LE()
-        skips.append(buf.read(2))  # Looks line another copy of next_id
-        next_id = buf.uint16LE()
-        flag = buf.uint16LE()
-        num_decorations = buf.uint16LE()
-        num_first_letters = buf.uint16LE()
-        show_number = buf.uint16LE() > 0
-        skips.append(buf.read(30))  # TODO: what is this?
-
-        decorations: list[ImageInfo] = []
-        for _ in range(num_decorations):
-            decorations.append(ImageInfo.from_buf(buf))
-
-        first_letters: list[ImageInfo] = []
-        for _ in range(num_first_letters):
-            first_letters.append(ImageInfo.from_buf(buf))
+    def from_buf(cls, buf: FileBuffer, data: memoryview | None = None) -> PageData:
+        """Parse the page at the cursor of `buf`.
+
+        `data` holds all of `buf`, to search for the end of each paragraph in;
+        without it, it is taken for this page alone.
+        """
+        if data is None:
+            with _buffer_data(buf) as data:
+                return cls.from_buf(buf, data)
+        try:
+            return cls._from_buf(buf, data)
+        except RuntimeError as e:
+            # The buffer ran out in the middle of the page
+            raise ValueError("Data corruption") from e
+
+    @classmethod
+    def _from_buf(cls, buf: FileBuffer, data: memoryview) -> PageData:
+        (
+            x_pos,
+            y_pos,
+            width,
+            height,
+            number,
+            id,
+            prev_id,
+            skip_next_id,  # Looks line another copy of next_id
+            next_id,
+            flag,
+            num_decorations,
+            num_first_letters,
+            show_number,
+            skip_unknown,  # TODO: what is this?
+        ) = buf.unpack(cls.HEADER_FORMAT)
+
+        decorations = [
+            ImageInfo(*attrs)
+            for attrs in buf.unpack_many(ImageInfo.FORMAT, num_decorations)
+        ]
+        first_letters = [
+            ImageInfo(*attrs)
+            for attrs in buf.unpack_many(ImageInfo.FORMAT, num_first_letters)
+        ]
 
         return PageData(
             x_pos=x_pos,
@@ -248,66 +305,57 @@ class PageData:
             prev_id=prev_id,
             next_id=next_id,
             flag=flag,
-            show_number=show_number,
+            show_number=show_number > 0,
             decorations=decorations,
             first_letters=first_letters,
-            text_blocks=list(cls.read_paragraphs(buf)),
-            skips=skips,
+            text_blocks=list(cls.read_paragraphs(buf, data)),
+            skips=[skip_next_id, skip_unknown],
         )
 
     @classmethod
-    def read_paragraphs(cls, buf: FileBuffer) -> Iterable[TextInfo]:
+    def read_paragraphs(cls, buf: FileBuffer, data: memoryview) -> Iterable[TextInfo]:
         control = buf.uint8()
-        if control == 0xF0:
-            return
-
-        assert control == 0xF1, f"{control=:02X}"
-
-        while True:
-            text_block, control = cls.read_paragraph(buf)
+        while control == 0xF1:
+            text_block, control = cls.read_paragraph(buf, data)
             yield text_block
-            if control == 0xF0:
-                return
-
-            assert control == 0xF1, f"{control=:02X}"
+        if control != 0xF0:
+            raise ValueError("Data corruption")
 
     @classmethod
-    def read_paragraph(cls, buf: FileBuffer) -> tuple[TextInfo, int]:
+    def read_paragraph(cls, buf: FileBuffer, data: memoryview) -> tuple[TextInfo, int]:
         skips: list[bytes] = [buf.read(16)]
 
-        bytes_buf = BytesIO()
+        start = buf.tell()
+        end_match = _PARAGRAPH_END_RE.search(data, start)
+        if end_match is None:
+            raise ValueError("Data corruption")
+        end = end_match.start()
+        buf.seek(end + 1)
 
-        char = buf.read(1)
-        while char not in (b"\xf1", b"\xf0"):
-            bytes_buf.write(char)
-            char = buf.read(1)
-
-        bytes_buf.seek(0)
         paragraph = TextInfo(
             paragraph=True,
             skips=skips,
         )
-        paragraph.bytes = bytes_buf.read()
-        return paragraph, ord(char)
+        paragraph.bytes = bytes(data[start:end])
+        return paragraph, data[end]
 
     def write(self, buf: FileBuffer, is_last: bool) -> None:
-        buf.put_uint16LE(self.x_pos)
-        buf.put_uint16LE(self.y_pos)
-        buf.put_uint16LE(self.width)
-        buf.put_uint16LE(self.height)
-        buf.put_uint16LE(self.number)
-        buf.put_uint16LE(self.id)
-        buf.put_uint16LE(self.prev_id)
-        if is_last:
-            buf.put_uint16LE(65534)
-            buf.put_uint16LE(65535)
-        else:
-            buf.put_uint16LE(self.next_id)
-            buf.put_uint16LE(self.next_id)
-        buf.put_uint16LE(self.flag)
-        buf.put_uint16LE(len(self.decorations))
-        buf.put_uint16LE(len(self.first_letters))
-        buf.put_uint16LE(self.show_number)
+        next_ids = (65534, 65535) if is_last else (self.next_id, self.next_id)
+        buf.pack(
+            "<13H",
+            self.x_pos,
+            self.y_pos,
+            self.width,
+            self.height,
+            self.number,
+            self.id,
+            self.prev_id,
+            *next_ids,
+            self.flag,
+            len(self.decorations),
+            len(self.first_letters),
+            self.show_number,
+        )
         buf.write(self.skips[1])
 
         for decoration in self.decorations:
@@ -323,23 +371,106 @@ class PageData:
         buf.put_uint8(0xF0)
 
 
+class LazyPages(MutableSequence[PageData]):
+    """The pages of a book file, each parsed when it is first accessed.
+
+    Pages that were never accessed cannot have been edited, so `raw` still
+    returns their bytes from the file. The last page is the exception: its next
+    ids mark the end of the book, so it is always written anew.
+    """
+
+    def __init__(self, buf: FileBuffer, offsets: Sequence[int]) -> None:
+        self._buf = buf
+        self._data = memoryview(buf)
+        # A page runs up to the next one in the file, or to the end of it
+        starts = sorted(offsets)
+        ends = dict(zip(starts, [*starts[1:], buf.size()], strict=True))
+        self._ranges: list[tuple[int, int] | None] = [
+            (offset, ends[offset]) for offset in offsets
+        ]
+        self._pages: list[PageData | None] = [None] * len(offsets)
+        self._last_start = offsets[-1] if offsets else None
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    @overload
+    def __getitem__(self, index: int) -> PageData: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[PageData]: ...
+
+    def __getitem__(self, index: int | slice) -> PageData | list[PageData]:
+        if isinstance(index, slice):
+            return [self._page(i) for i in range(len(self))[index]]
+        return self._page(range(len(self))[index])
+
+    @overload
+    def __setitem__(self, index: int, value: PageData) -> None: ...
+
+    @overload
+    def __setitem__(self, index: slice, value: Iterable[PageData]) -> None: ...
+
+    def __setitem__(
+        self, index: int | slice, value: PageData | Iterable[PageData]
+    ) -> None:
+        if isinstance(index, slice):
+            assert not isinstance(value, PageData)
+            pages = list(value)
+            self._pages[index] = pages
+            self._ranges[index] = [None] * len(pages)
+        else:
+            assert isinstance(value, PageData)
+            self._pages[index] = value
+            self._ranges[index] = None
+
+    def __delitem__(self, index: int | slice) -> None:
+        del self._pages[index]
+        del self._ranges[index]
+
+    def insert(self, index: int, value: PageData) -> None:
+        self._pages.insert(index, value)
+        self._ranges.insert(index, None)
+
+    def raw(self, index: int) -> memoryview | None:
+        """Return the page as it is in the file, or None if it may have changed."""
+        page_range = self._ranges[index]
+        if page_range is None or page_range[0] == self._last_start:
+            return None
+        start, end = page_range
+        return self._data[start:end]
+
+    def _page(self, index: int) -> PageData:
+        page = self._pages[index]
+        if page is None:
+            start, _ = self._ranges[index]  # type: ignore[misc]
+            self._buf.seek(start)
+            page = PageData.from_buf(self._buf, self._data)
+            self._pages[index] = page
+            # Handing the page out allows it to be edited
+            self._ranges[index] = None
+        return page
+
+
 @dataclass
 class Book:
-    pages: list[PageData]
+    pages: MutableSequence[PageData]
 
     @classmethod
     def from_file(cls, path: Path) -> Book:
+        return cls(pages=list(cls.open(path).pages))
+
+    @classmethod
+    def open(cls, path: Path) -> Book:
+        """Read only the page table; pages are parsed as they are accessed.
+
+        Writing the book copies the pages that were never accessed as they are.
+        """
         buf = FileBuffer.from_file(path)
         _ = buf.uint32LE()  # file size
         num_pages = buf.uint16LE()
-        page_offsets = [buf.uint32LE() for _ in range(num_pages)]
-
-        pages: list[PageData] = []
-
-        for page_offset in page_offsets:
-            buf.seek(4 + page_offset)
-            pages.append(PageData.from_buf(buf))
-        return cls(pages=pages)
+        page_offsets = buf.read_array("I", num_pages)
+        return cls(pages=LazyPages(buf, [4 + offset for offset in page_offsets]))
 
     def add_page(
         self,
@@ -377,17 +508,24 @@ class Book:
         last_page.skips[0] = last_page.next_id.to_bytes(2, "little", signed=False)
 
     def to_file(self, path: Path) -> None:
-        file_size = sum(p.size for p in self.pages) + len(self.pages) * 4 + 2
-        buf = FileBuffer(4 + file_size)
-        buf.put_uint32LE(file_size)
+        buf = FileBuffer.growable()
+        buf.put_uint32LE(0)  # File size, patched below
         buf.put_uint16LE(len(self.pages))
-        page_offsets: list[int] = [2 + len(self.pages) * 4]
-        for page in self.pages[:-1]:
-            page_offsets.append(page_offsets[-1] + page.size)
-        for offset in page_offsets:
-            buf.put_uint32LE(offset)
-        for i, page in enumerate(self.pages, 1):
-            is_last = i == len(self.pages)
-            page.write(buf, is_last)
+        offsets_start = buf.tell()
+        buf.skip(4 * len(self.pages))
+        for i in range(len(self.pages)):
+            # Page offsets are relative to the end of the file size field
+            buf.patch_uint32LE(offsets_start + 4 * i, buf.tell() - 4)
+            is_last = i == len(self.pages) - 1
+            # The last page is always written, as it ends the chain of next ids
+            raw = None
+            if isinstance(self.pages, LazyPages) and not is_last:
+                # Pages that were never accessed are copied as they are
+                raw = self.pages.raw(i)
+            if raw is not None:
+                buf.write(raw)
+            else:
+                self.pages[i].write(buf, is_last)
+        buf.patch_uint32LE(0, buf.size() - 4)
 
         buf.to_file(path)
@@ -106,33 +106,32 @@ class Font:
     @classmethod
     def from_file(cls, path: Path) -> Font:
         buf = FileBuffer.from_file(path)
-        tag = buf.uint32LE()
-        if tag != 0x3A544E46:
+        if buf.uint32LE() != 0x3A544E46:
             raise ValueError(f"{path} is not a font file")
 
-        _ = buf.uint32LE()  # size of the tagged content
-
-        skips: list[bytes] = []
-        skips.append(buf.read(2))
-        height = buf.uint8()
-
-        skips.append(buf.read(1))
-        first = buf.uint8()
-        num_chars = buf.uint8()
-
-        skips.append(buf.read(2))
-
-        if buf.uint8() != 1:
+        (
+            _,  # size of the tagged content
+            skip_0,
+            height,
+            skip_1,
+            first,
+            num_chars,
+            skip_2,
+            compression,
+            glyphbuf_size,
+        ) = buf.unpack("<I2sBsBB2sBI")
+        skips: list[bytes] = [skip_0, skip_1, skip_2]
+
+        if compression != 1:
             raise ValueError(f"Compression error: {path}")
 
-        glyphbuf_size = buf.uint32LE()
         glyphbuf = buf.decompressRLE(glyphbuf_size)
 
         if not buf.at_end():
             raise ValueError("Not all data is consumed")
 
-        glyph_offsets: list[int] = [glyphbuf.uint16LE() for _ in range(num_chars)]
-        glyph_widths: list[int] = [glyphbuf.uint8() for _ in range(num_chars)]
+        glyph_offsets = glyphbuf.read_array("H", num_chars)
+        glyph_widths = glyphbuf.read_array("B", num_chars)
 
         glyph_data_start: int = glyphbuf.tell()
         glyphs: list[Glyph] = []
@@ -162,52 +161,28 @@ class Font:
 
     def to_file(self, path: Path) -> None:
         num_chars = len(self.glyphs)
-        glyph_sizes = [
-            self.height * (1 if glyph.width <= 8 else 2) for glyph in self.glyphs
-        ]
-        glyph_data_length = sum(glyph_sizes)
-
-        glyph_offsets = [0]
-        for size in glyph_sizes[:-1]:
-            glyph_offsets.append(glyph_offsets[-1] + size)
-
-        glyph_widths = [g.width for g in self.glyphs]
-
-        glyph_offsets_length = 2 * num_chars
-        glyph_widths_length = 1 * num_chars
-        uncompressed_size = (
-            glyph_offsets_length + glyph_widths_length + glyph_data_length
-        )
-        glyphbuf_uncompressed = FileBuffer(uncompressed_size)
-        for offset in glyph_offsets:
-            glyphbuf_uncompressed.put_uint16LE(offset)
-        for width in glyph_widths:
-            glyphbuf_uncompressed.put_uint8(width)
+        glyphbuf_uncompressed = FileBuffer.growable()
+        glyphbuf_uncompressed.skip(2 * num_chars)  # Glyph offsets, patched below
         for glyph in self.glyphs:
+            glyphbuf_uncompressed.put_uint8(glyph.width)
+        glyph_data_start = glyphbuf_uncompressed.tell()
+        for i, glyph in enumerate(self.glyphs):
+            glyphbuf_uncompressed.patch_uint16LE(
+                2 * i, glyphbuf_uncompressed.tell() - glyph_data_start
+            )
             for row in glyph.rows:
                 glyphbuf_uncompressed.put_uint8(row // 256)
                 if glyph.width > 8:
                     glyphbuf_uncompressed.put_uint8(row % 256)
+        uncompressed_size = glyphbuf_uncompressed.size()
 
-        compressed_size, glyphbuf_compressed = glyphbuf_uncompressed.compressRLE()
-
-        buf = FileBuffer(
-            4  # Tag
-            + 4  # Tagged content size
-            + 2  # Skip 2
-            + 1  # Height
-            + 1  # Skip 1
-            + 1  # First char
-            + 1  # Num Chars
-            + 2  # Glyphbuf size - trimmed
-            + 1  # Compression type (1)
-            + 4  # Glyphbuf size
-            + compressed_size
-        )
+        _, glyphbuf_compressed = glyphbuf_uncompressed.compressRLE("optimal")
+
+        buf = FileBuffer.growable()
 
         buf.put_uint32LE(0x3A544E46)
 
-        buf.put_uint32LE(buf.size() - 8)  # size of the tagged content
+        buf.put_uint32LE(0)  # Size of the tagged content, patched below
 
         # Skip 2
         buf.write(self.skips[0])
@@ -226,6 +201,6 @@ class Font:
         buf.put_uint8(1)  # Compression type
         buf.put_uint32LE(uncompressed_size)  # Glyphbuf size
 
-        buf.write(glyphbuf_compressed.read())
+        buf.patch_uint32LE(4, buf.size() + glyphbuf_compressed.size() - 8)
 
-        buf.to_file(path)
+        FileBuffer.to_file_many(path, [buf, glyphbuf_compressed])
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import os
+from array import array
+from collections.abc import MutableSequence
 from dataclasses import dataclass
 from pathlib import Path
 from typing import ClassVar, NamedTuple
@@ -55,6 +57,10 @@ def all_bmx_to_png_command(src_dir: Path, dest_dir: Path) -> None:
     all_bmx_to_png(src_dir, dest_dir)
 
 
+HIGH_NIBBLES = bytes(c >> 4 for c in range(256))
+LOW_NIBBLES = bytes(c & 0x0F for c in range(256))
+
+
 @dataclass
 class Image:
     FLAG_XYSWAPPED = 0x20
@@ -65,7 +71,7 @@ class Image:
     height: int
     flags: int
     hires_locol: bool
-    pixels: list[int]
+    pixels: MutableSequence[int]
 
     @property
     def size(self) -> int:
@@ -94,20 +100,19 @@ class Image:
             buf = buf.decompressRLE(width * height)
 
         if flags & cls.FLAG_XYSWAPPED:
-            pixels = [0] * width * height
+            # Stored column by column
+            columns = buf.read_array("B", width * height)
+            pixels = array("B", bytes(width * height))
             for x in range(width):
-                for y in range(height):
-                    pixels[x + width * y] = buf.uint8()
+                pixels[x::width] = columns[x * height : (x + 1) * height]
+        elif hires_locol:
+            # Two 4-bit pixels per byte, the high nibble first
+            packed = buf.read(height * (width // 2))
+            pixels = array("B", bytes(2 * len(packed)))
+            pixels[0::2] = array("B", packed.translate(HIGH_NIBBLES))
+            pixels[1::2] = array("B", packed.translate(LOW_NIBBLES))
         else:
-            if hires_locol:
-                pixels = []
-                for _y in range(height):
-                    for _x in range(width // 2):
-                        c = buf.uint8()
-                        pixels.append((c & 0xF0) >> 4)
-                        pixels.append(c & 0x0F)
-            else:
-                pixels = [buf.uint8() for _ in range(width * height)]
+            pixels = buf.read_array("B", width * height)
 
         assert len(pixels) == width * height
 
@@ -119,8 +124,29 @@ class Image:
             pixels=pixels,
         )
 
+    def to_bytes(self) -> bytes:
+        """Encode the pixels the same way `from_buf` decodes them."""
+        if self.flags & self.FLAG_XYSWAPPED:
+            data = b"".join(
+                bytes(self.pixels[x :: self.width]) for x in range(self.width)
+            )
+        elif self.hires_locol:
+            data = bytes(
+                (hi << 4) | lo
+                for hi, lo in zip(self.pixels[::2], self.pixels[1::2], strict=True)
+            )
+        else:
+            data = bytes(self.pixels)
+
+        if self.flags & self.FLAG_COMPRESSED:
+            buf = FileBuffer(len(data))
+            buf.write(data)
+            _, compressed_buf = buf.compressRLE("optimal")
+            data = compressed_buf.read()
+        return data
+
     def to_buf(self, buf: FileBuffer) -> None:
-        raise NotImplementedError
+        buf.write(self.to_bytes())
 
 
 @dataclass
@@ -552,70 +578,48 @@ class BMXResource:
     skips: list[bytes]
 
     def to_file(self, path: Path) -> None:
-        uncompressed_size = sum(i.size for i in self.images)
-        uncompressed_buf = FileBuffer(uncompressed_size)
+        buf = FileBuffer.growable()
+        buf.put_uint16LE(0x1066)
+        buf.put_uint16LE(self.compression)
+        buf.put_uint16LE(len(self.images))
+        buf.write(self.skips[0])
+        uncompressed_size_offset = buf.tell()
+        buf.put_uint32LE(0)  # Uncompressed size, patched below
+
+        uncompressed_buf = FileBuffer.growable()
         for image in self.images:
+            start = uncompressed_buf.tell()
             image.to_buf(uncompressed_buf)
+            data_size = uncompressed_buf.tell() - start
+            buf.pack("<4H", data_size, image.flags, image.width, image.height)
+        uncompressed_size = uncompressed_buf.size()
+        buf.patch_uint32LE(uncompressed_size_offset, uncompressed_size)
 
         if self.compression == self.COMPRESSION_LZW:
-            raise NotImplementedError("LZW compression is not supported yet")
+            _, compressed_buf = uncompressed_buf.compressLZW()
         elif self.compression == self.COMPRESSION_LZSS:
-            raise NotImplementedError("LZSS compression is not supported yet")
+            _, compressed_buf = uncompressed_buf.compressLZSS()
         elif self.compression == self.COMPRESSION_RLE:
-            compressed_size, compressed_buf = uncompressed_buf.compressRLE()
+            _, compressed_buf = uncompressed_buf.compressRLE("optimal")
         else:
             raise AssertionError()
 
-        size = (
-            2
-            + 2  # data validation
-            + 2  # compression
-            + len(self.skips[0])  # num images
-            + 4  # first skip
-            + 2 * 4 * len(self.images)  # uncompressed size
-            + compressed_size  # image attributes
-        )
-        if self.compression == self.COMPRESSION_LZW:
-            size += 5
-
-        buf = FileBuffer(size)
-        buf.put_uint16LE(0x1066)
-        buf.put_uint16LE(self.compression)
-        buf.put_uint16LE(len(self.images))
-        buf.write(self.skips[0])
-        buf.put_uint32LE(uncompressed_size)
-
-        for image in self.images:
-            buf.put_uint16LE(image.size)
-            buf.put_uint16LE(image.flags)
-            buf.put_uint16LE(image.width)
-            buf.put_uint16LE(image.height)
-
         if self.compression == self.COMPRESSION_LZW:
             buf.put_uint8(0x02)
             buf.put_uint32LE(uncompressed_size)
 
-        buf.write(compressed_buf.read())
-
-        buf.to_file(path)
+        FileBuffer.to_file_many(path, [buf, compressed_buf])
 
     @classmethod
     def from_file(cls, path: Path) -> BMXResource:
         buf = FileBuffer.from_file(path)
-        if buf.uint16LE() != 0x1066:
+        tag, compression, num_images, skip, uncompressed_size = buf.unpack("<3H2sI")
+        if tag != 0x1066:
             raise ValueError("Data corruption")
-        compression = buf.uint16LE()
-        num_images = buf.uint16LE()
-        skips: list[bytes] = [buf.read(2)]
-        uncompressed_size = buf.uint32LE()
-
-        image_attrs = []
-        for _ in range(num_images):
-            data_size = buf.uint16LE()
-            flags = buf.uint16LE()
-            width = buf.uint16LE()
-            height = buf.uint16LE()
-            image_attrs.append((data_size, flags, width, height))
+        skips: list[bytes] = [skip]
+
+        # data size, flags, width, height
+        image_attrs = buf.unpack_many("<4H", num_images)
 
         if compression == cls.COMPRESSION_LZW:
             if buf.uint8() != 0x02:
@@ -632,9 +636,8 @@ class BMXResource:
 
         images: list[Image] = []
         for data_size, flags, width, height in image_attrs:
-            image_buf = FileBuffer(data_size)
-            image_buf.write(decompressed_buf.read(data_size))
-            image_buf.seek(0)
+            image_buf = decompressed_buf.view(decompressed_buf.tell(), data_size)
+            decompressed_buf.skip(data_size)
             images.append(Image.from_buf(image_buf, width, height, flags=flags))
 
         return BMXResource(
@@ -719,7 +722,19 @@ class SCXResource:
         return SCXResource(image=image)
 
     def to_file(self, path: Path) -> None:
-        raise NotImplementedError
+        data = self.image.to_bytes()
+        uncompressed_buf = FileBuffer(len(data))
+        uncompressed_buf.write(data)
+        _, compressed_buf = uncompressed_buf.compressLZW()
+
+        buf = FileBuffer.growable()
+        # Book screens have no tag
+        if not self.image.hires_locol:
+            buf.put_uint16LE(0x27B6)
+        buf.put_uint8(0x02)
+        buf.put_uint32LE(len(data))
+
+        FileBuffer.to_file_many(path, [buf, compressed_buf])
 
 
 class Color(NamedTuple):
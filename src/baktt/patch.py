@@ -184,7 +184,7 @@ def patch_game(
         # Extract game resources
         temp_resources = Path(mkdtemp(prefix="bak_patch_resources_"))
         print("Extracting game resources from krondor.rmf...")
-        extract_resources(rmf_path, temp_resources)
+        extract_resources(rmf_path, temp_resources, jobs=os.cpu_count() or 1)
         print("✓ Extracted resources to temporary directory")
         print()
 
@@ -1,37 +1,99 @@
+from __future__ import annotations
+
 import csv
+import dataclasses
+import hashlib
+import io
+import json
 import os
-import shutil
-from collections.abc import Generator, Iterable
+import tempfile
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from tempfile import mkdtemp
+from types import TracebackType
+from typing import Annotated, BinaryIO, Literal
 
-from cyclopts import App
+from cyclopts import App, Parameter, validators
 from filebuffer import FileBuffer
 
 app = App(name="resources", help="Operations on the resource archive")
 
 
 RES_FILENAME_LEN = 13
+# Resource name and data size
+RES_HEADER_LEN = RES_FILENAME_LEN + 4
 RESOURCE_LIST_NAME = "_resources.csv"
+# Size, modification time and digest of every extracted file
+MANIFEST_NAME = "_manifest.csv"
+# Resource data queued for the extraction workers but not yet written
+MAX_IN_FLIGHT_BYTES = 64 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+SortOrder = Literal["map", "name", "size"]
 
 
 @app.command(name="list")
-def list_command(resource_map_path: Path) -> None:
-    """List resources in the specified resource map file."""
-    list_resources(resource_map_path)
+def list_command(
+    resource_map_path: Path,
+    *,
+    as_json: Annotated[bool, Parameter(name="--json")] = False,
+    sort: SortOrder = "map",
+) -> None:
+    """List resources in the specified resource map file.
+
+    Parameters
+    ----------
+    resource_map_path
+        Path to the resource map file.
+    as_json
+        Print the archive contents as JSON.
+    sort
+        Order of the resources: as in the map, by name, or by size (largest first).
+    """
+    list_resources(resource_map_path, sort=sort, as_json=as_json)
 
 
 @app.command(name="extract")
-def extract_command(resource_map_path: Path, extract_to: Path) -> None:
-    """Extract resources based on the specified resource map file."""
-    extract_resources(resource_map_path, extract_to)
+def extract_command(
+    resource_map_path: Path,
+    extract_to: Path,
+    *,
+    jobs: Annotated[int, Parameter(validator=validators.Number(gte=1))] = 1,
+) -> None:
+    """Extract resources based on the specified resource map file.
+
+    Parameters
+    ----------
+    resource_map_path
+        Path to the resource map file.
+    extract_to
+        Directory to extract the resources to.
+    jobs
+        Number of threads writing the resource files.
+    """
+    extract_resources(resource_map_path, extract_to, jobs=jobs)
 
 
 @app.command(name="archive")
-def archive_command(resource_list_path: Path, save_to: Path) -> None:
-    """Archive resources listed in the specified resources list file."""
-    archive_resources(resource_list_path, save_to)
+def archive_command(
+    resource_list_path: Path, save_to: Path, *, verify: bool = False
+) -> None:
+    """Archive resources listed in the specified resources list file.
+
+    Parameters
+    ----------
+    resource_list_path
+        Path to the resources list file.
+    save_to
+        Directory to save the archive and the resource map to.
+    verify
+        Check that no two resources share a key. Whether each key matches its
+        name is not checked, as the game's name hash is not known.
+    """
+    archive_resources(resource_list_path, save_to, verify=verify)
 
 
 @app.command(name="archive-modified")
@@ -42,142 +104,583 @@ def archive_modified_command(
     archive_modified_resources(resource_map_path, modified_dir, save_to)
 
 
-def list_resources(resource_map_path: Path) -> None:
-    archive_name, resources = _load_resources(resource_map_path)
+@app.command(name="extract-one")
+def extract_one_command(resource_map_path: Path, name: str, extract_to: Path) -> None:
+    """Extract a single resource by name."""
+    extract_resource(resource_map_path, name, extract_to)
+
+
+@app.command(name="diff")
+def diff_command(resource_map_a: Path, resource_map_b: Path) -> None:
+    """Show which resources differ between two archives, and where."""
+    diff_resources(resource_map_a, resource_map_b)
+
+
+def list_resources(
+    resource_map_path: Path, sort: SortOrder = "map", as_json: bool = False
+) -> None:
+    # Only the entry headers are read, never the resource data
+    with ResourceArchive(resource_map_path) as archive:
+        archive_name = archive.archive_name
+        entries = list(archive)
+    if sort == "name":
+        entries.sort(key=lambda entry: entry.name)
+    elif sort == "size":
+        entries.sort(key=lambda entry: entry.size, reverse=True)
+
+    if as_json:
+        print(
+            json.dumps(
+                {
+                    "archive": archive_name,
+                    "resources": [dataclasses.asdict(entry) for entry in entries],
+                },
+                indent=2,
+            )
+        )
+        return
+
     print("Archive:", archive_name)
-    for resource in resources:
-        print(resource)
+    for entry in entries:
+        print(f"{entry.name}\t{entry.size} bytes")
+
+
+def extract_resources(
+    resource_map_path: Path,
+    extract_to: Path,
+    jobs: int = 1,
+    max_in_flight: int = MAX_IN_FLIGHT_BYTES,
+) -> None:
+    """Extract every resource into `extract_to`, along with the resource list.
 
+    Files that are unchanged since the last extraction, according to the
+    manifest left next to the resource list, are not written again.
 
-def extract_resources(resource_map_path: Path, extract_to: Path) -> None:
+    `max_in_flight` limits how many bytes of resource data are queued for the
+    `jobs` writer threads at a time. It bounds the queued work, not memory: the
+    workers write straight from the mapped archive, without copying the data.
+    """
     extract_to.mkdir(parents=True, exist_ok=True)
-    resource_list_path = extract_to / RESOURCE_LIST_NAME
-    resource_map_name = resource_map_path.name
-
-    with open(resource_list_path, "w") as resource_list_file:
-        resource_list_writer = csv.writer(resource_list_file)
-        resource_archive_name, resources = _load_resources(resource_map_path)
-        resource_list_writer.writerow(
-            (
-                resource_map_name,
-                resource_archive_name,
+    manifest_path = extract_to / MANIFEST_NAME
+    manifest = _read_manifest(manifest_path)
+
+    resource_list = io.StringIO()
+    resource_list_writer = csv.writer(resource_list)
+
+    # The workers only write the resource files; the lists are written here, in
+    # map order. When the queue budget is used up, wait for the oldest writes to
+    # finish before handing out more.
+    results: list[Future[ManifestEntry]] = []
+    pending: deque[tuple[Future[ManifestEntry], int]] = deque()
+    in_flight = 0
+    with (
+        ResourceArchive(resource_map_path) as archive,
+        ThreadPoolExecutor(max_workers=jobs) as executor,
+    ):
+        resource_list_writer.writerow((resource_map_path.name, archive.archive_name))
+        for entry in archive:
+            while pending and in_flight + entry.size > max_in_flight:
+                future, done_size = pending.popleft()
+                future.result()
+                in_flight -= done_size
+            future = executor.submit(
+                _extract_file,
+                extract_to / entry.name,
+                archive.data(entry),
+                manifest.get(entry.name),
             )
-        )
-        for resource in resources:
-            resource_path = extract_to / resource.name
-            resource_path.write_bytes(resource.data)
-            resource_list_writer.writerow((resource.name, str(resource.hashkey)))
+            results.append(future)
+            pending.append((future, entry.size))
+            in_flight += entry.size
+            resource_list_writer.writerow((entry.name, str(entry.hashkey)))
+
+    _write_if_changed(extract_to / RESOURCE_LIST_NAME, resource_list.getvalue())
+    _write_manifest(manifest_path, [future.result() for future in results])
+
 
+def extract_resource(resource_map_path: Path, name: str, extract_to: Path) -> None:
+    with ResourceArchive(resource_map_path) as archive:
+        if name not in archive:
+            raise ValueError(f"{name} is not in {archive.archive_name}")
+        entry = archive.entry(name)
+        extract_to.mkdir(parents=True, exist_ok=True)
+        (extract_to / entry.name).write_bytes(archive.data(entry))
 
-def archive_resources(resource_list_path: Path, save_to: Path) -> None:
+
+def archive_resources(
+    resource_list_path: Path, save_to: Path, verify: bool = False
+) -> None:
     if not resource_list_path.exists():
         raise ValueError(f"{resource_list_path} does not exist")
 
     resource_dir_path = resource_list_path.parent
 
-    # Save `krondor.001`
-    offsets_and_hashes: list[tuple[int, int]] = []
-    resource_archive_size = 0
-    with open(resource_list_path) as resource_list_file:
-        resource_list_reader = csv.reader(resource_list_file)
-        next(resource_list_reader)
-        for resource_name, _hashkey in resource_list_reader:
-            resource_path = resource_dir_path / resource_name
-            if not resource_path.exists():
-                raise ValueError(f"{resource_path} does not exist")
-            resource_archive_size += RES_FILENAME_LEN
-            resource_archive_size += 4  # resource size
-            resource_archive_size += resource_path.stat().st_size
-
-    resource_archive_buffer = FileBuffer(resource_archive_size)
     with open(resource_list_path) as resource_list_file:
         resource_list_reader = csv.reader(resource_list_file)
         resource_map_name, resource_archive_name = next(resource_list_reader)
-        for resource_name, hashkey in resource_list_reader:
-            resource_path = resource_dir_path / resource_name
-            resource = Resource(
-                name=resource_name,
-                hashkey=int(hashkey),
-                data=resource_path.read_bytes(),
-            )
-            offset = _save_resource_to_archive(resource_archive_buffer, resource)
-            offsets_and_hashes.append((offset, int(hashkey)))
-    save_to.mkdir(parents=True, exist_ok=True)
-    resource_archive_buffer.to_file(save_to / resource_archive_name)
+        listed = _read_resource_list(resource_list_reader, resource_dir_path)
 
-    # Save `krondor.rmf`
-    resource_map_size = 4 + 2 + RES_FILENAME_LEN + 2 + 8 * len(offsets_and_hashes)
-    resource_map_buffer = FileBuffer(resource_map_size)
-    resource_map_buffer.put_uint32LE(1)
-    resource_map_buffer.put_uint16LE(4)
-    resource_map_buffer.put_string(resource_archive_name, RES_FILENAME_LEN)
-    resource_map_buffer.put_uint16LE(len(offsets_and_hashes))
-    for offset, hashnum in offsets_and_hashes:
-        resource_map_buffer.put_uint32LE(hashnum)
-        resource_map_buffer.put_uint32LE(offset)
-    resource_map_buffer.to_file(save_to / resource_map_name)
+    # Check the keys before anything is written
+    if verify:
+        problems = verify_hashes((name, hashkey) for name, hashkey, _ in listed)
+        if problems:
+            raise ValueError("\n".join(problems))
+
+    save_to.mkdir(parents=True, exist_ok=True)
+    # The paths are replaced in reverse: the archive first, then the map that
+    # points into it
+    with (
+        _atomic_path(save_to / resource_map_name) as resource_map_path,
+        _atomic_path(save_to / resource_archive_name) as archive_path,
+    ):
+        # Save `krondor.001`, one resource at a time
+        offsets_and_hashes: list[tuple[int, int]] = []
+        with open(archive_path, "wb") as archive_file:
+            for name, hashkey, path in listed:
+                resource = Resource(name=name, hashkey=hashkey, data=path.read_bytes())
+                offsets_and_hashes.append(
+                    (_write_resource(archive_file, resource), hashkey)
+                )
+
+        # Save `krondor.rmf`
+        _save_resource_map(resource_map_path, resource_archive_name, offsets_and_hashes)
 
 
 def archive_modified_resources(
     resource_map_path: Path, modified_dir: Path, save_to: Path
 ) -> None:
-    tmpdir = Path(mkdtemp())
-    extract_resources(resource_map_path, tmpdir)
-    for filename in os.listdir(modified_dir):
-        shutil.copy(modified_dir / filename, tmpdir)
-    archive_resources(tmpdir / "_resources.csv", save_to)
-    shutil.rmtree(tmpdir)
+    """Rebuild the archive with the resources found in `modified_dir` replaced.
+
+    Runs of unchanged resources are copied from the original archive as they
+    are, so only the modified resources are read from `modified_dir`. The
+    original archive may be the one being replaced. Files in `modified_dir` are
+    matched to resources by name, case-insensitively; a file that matches none
+    is an error.
+    """
+    if not modified_dir.is_dir():
+        raise ValueError(f"{modified_dir} is not a directory")
+
+    with ResourceArchive(resource_map_path) as archive:
+        modified = {
+            path.name.upper(): path for path in modified_dir.iterdir() if path.is_file()
+        }
+        unknown = sorted(
+            path.name for name, path in modified.items() if name not in archive
+        )
+        if unknown:
+            raise ValueError(
+                f"{', '.join(unknown)} in {modified_dir} not in {archive.archive_name}"
+            )
+
+        save_to.mkdir(parents=True, exist_ok=True)
+        offsets_and_hashes: list[tuple[int, int]] = []
+        # The archive is replaced before the map that points into it
+        with (
+            _atomic_path(save_to / resource_map_path.name) as new_resource_map_path,
+            _atomic_path(save_to / archive.archive_name) as archive_path,
+            open(archive.archive_path, "rb") as src,
+            open(archive_path, "wb") as dst,
+        ):
+            # Unchanged entries that follow each other in the original archive
+            # are copied as one range
+            copy_start = copy_end = 0
+            for entry in archive:
+                offset = dst.tell() + copy_end - copy_start
+                offsets_and_hashes.append((offset, entry.hashkey))
+                modified_path = modified.get(entry.name.upper())
+                if modified_path is None:
+                    if entry.offset != copy_end:
+                        _copy_file_range(src, dst, copy_start, copy_end - copy_start)
+                        copy_start = entry.offset
+                    copy_end = entry.data_offset + entry.size
+                    continue
+
+                _copy_file_range(src, dst, copy_start, copy_end - copy_start)
+                copy_start = copy_end = 0
+                resource = Resource(
+                    name=entry.name,
+                    hashkey=entry.hashkey,
+                    data=modified_path.read_bytes(),
+                )
+                _write_resource(dst, resource)
+            _copy_file_range(src, dst, copy_start, copy_end - copy_start)
+            _save_resource_map(
+                new_resource_map_path, archive.archive_name, offsets_and_hashes
+            )
+
+
+def diff_resources(resource_map_a: Path, resource_map_b: Path) -> None:
+    # Payloads are only read when both sizes match, so the cost is in the data
+    # that may have changed, not in the whole archives
+    with (
+        ResourceArchive(resource_map_a) as archive_a,
+        ResourceArchive(resource_map_b) as archive_b,
+    ):
+        print(f"--- {archive_a.archive_path}")
+        print(f"+++ {archive_b.archive_path}")
+
+        added = removed = changed = 0
+        for entry_a in archive_a:
+            if entry_a.name not in archive_b:
+                print(f"- {entry_a.name}\t{entry_a.size} bytes")
+                removed += 1
+                continue
+            entry_b = archive_b.entry(entry_a.name)
+            if entry_a.size != entry_b.size:
+                print(f"~ {entry_a.name}\t{entry_a.size} -> {entry_b.size} bytes")
+                changed += 1
+                continue
+            summary = _describe_changes(
+                archive_a.data(entry_a), archive_b.data(entry_b)
+            )
+            if summary is not None:
+                print(f"~ {entry_a.name}\t{entry_a.size} bytes, {summary}")
+                changed += 1
+        for entry_b in archive_b:
+            if entry_b.name not in archive_a:
+                print(f"+ {entry_b.name}\t{entry_b.size} bytes")
+                added += 1
+
+    print(f"{added} added, {removed} removed, {changed} changed")
+
+
+def verify_hashes(names_and_hashes: Iterable[tuple[str, int]]) -> list[str]:
+    """Describe every key that is used by more than one resource."""
+    problems = []
+    names_by_hash: dict[int, str] = {}
+    for name, hashkey in names_and_hashes:
+        if hashkey in names_by_hash:
+            problems.append(
+                f"{name}: key {hashkey:#010x} collides with {names_by_hash[hashkey]}"
+            )
+        else:
+            names_by_hash[hashkey] = name
+    return problems
 
 
 @dataclass
 class Resource:
     hashkey: int
     name: str
-    data: bytes
+    data: bytes | memoryview
 
     def __str__(self) -> str:
         return f"{self.name}\t{len(self.data)} bytes"
 
 
-def _load_resources(resource_map_path: Path) -> tuple[str, Iterable[Resource]]:
-    rmf = FileBuffer.from_file(resource_map_path)
-    if rmf.uint32LE() != 1 or rmf.uint16LE() != 4:
-        raise ValueError("Data corruption")
+@dataclass(frozen=True)
+class ManifestEntry:
+    """An extracted resource file, as it was left by the last extraction."""
 
-    resource_archive_filename = rmf.string(RES_FILENAME_LEN)
-    num_resources = rmf.uint16LE()
+    name: str
+    size: int
+    mtime_ns: int
+    digest: str
 
-    resources_archive_path = resource_map_path.parent / resource_archive_filename
-    if not resources_archive_path.exists():
-        raise ValueError(f"{resource_archive_filename} is missing")
 
-    rf = FileBuffer.from_file(resources_archive_path)
+@dataclass(frozen=True)
+class ResourceEntry:
+    name: str
+    hashkey: int
+    # Offset of the entry header in the archive
+    offset: int
+    size: int
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + RES_HEADER_LEN
+
+
+class ResourceArchive:
+    """A resource map (`krondor.rmf`) and the archive it points to (`krondor.001`).
+
+    Opening it reads the map and the 17-byte header of every resource; the data
+    itself is only mapped from disk when it is accessed. Resources are looked up
+    by name, case-insensitively, and iterated in the order of the map.
+
+    The archive stays mapped until `close` is called, or otherwise for as long
+    as this object or any resource data taken from it is alive.
+    """
+
+    def __init__(self, resource_map_path: Path) -> None:
+        with FileBuffer.from_mmap(resource_map_path) as rmf:
+            if rmf.uint32LE() != 1 or rmf.uint16LE() != 4:
+                raise ValueError("Data corruption")
+            self.archive_name = rmf.string(RES_FILENAME_LEN)
+            num_resources = rmf.uint16LE()
+            hashes_and_offsets = rmf.unpack_many("<2I", num_resources)
+
+        self.archive_path = resource_map_path.parent / self.archive_name
+        if not self.archive_path.exists():
+            raise ValueError(f"{self.archive_name} is missing")
+
+        self._rf = FileBuffer.from_mmap(self.archive_path)
+        self._entries: list[ResourceEntry] = []
+        for hashkey, offset in hashes_and_offsets:
+            self._rf.seek(offset)
+            name = self._rf.string(RES_FILENAME_LEN)
+            size = self._rf.uint32LE()
+            self._entries.append(ResourceEntry(name, hashkey, offset, size))
+        self._index = {entry.name.upper(): entry for entry in self._entries}
+        # Keys used by more than one entry map to all of them, as which one the
+        # game would load is not known
+        self._hash_index: dict[int, list[ResourceEntry]] = {}
+        for entry in self._entries:
+            self._hash_index.setdefault(entry.hashkey, []).append(entry)
+
+    def __enter__(self) -> ResourceArchive:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        try:
+            self.close()
+        except BufferError:
+            # The traceback may still hold resource data; the mapping is then
+            # released along with it
+            if exc_type is None:
+                raise
+
+    def close(self) -> None:
+        """Unmap the archive. Resource data taken from it must be released first."""
+        self._rf.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[ResourceEntry]:
+        return iter(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name.upper() in self._index
+
+    def entry(self, name: str) -> ResourceEntry:
+        return self._index[name.upper()]
+
+    def entry_by_hash(self, hashkey: int) -> ResourceEntry:
+        entries = self._hash_index[hashkey]
+        if len(entries) > 1:
+            names = ", ".join(entry.name for entry in entries)
+            raise ValueError(f"Key {hashkey:#010x} is used by {names}")
+        return entries[0]
+
+    def verify(self) -> list[str]:
+        """Check the keys in the map, see `verify_hashes`."""
+        return verify_hashes((entry.name, entry.hashkey) for entry in self._entries)
+
+    def data(self, entry: ResourceEntry) -> memoryview:
+        """Return the data of the resource without copying it."""
+        return memoryview(self._rf.view(entry.data_offset, entry.size))
+
+    def __getitem__(self, name: str) -> Resource:
+        return self._resource(self.entry(name))
+
+    def resources(self) -> Iterator[Resource]:
+        for entry in self._entries:
+            yield self._resource(entry)
+
+    def _resource(self, entry: ResourceEntry) -> Resource:
+        return Resource(hashkey=entry.hashkey, name=entry.name, data=self.data(entry))
+
+
+def _extract_file(
+    path: Path, data: memoryview, known: ManifestEntry | None
+) -> ManifestEntry:
+    digest = _digest(data)
+    if known is not None and known.size == len(data) and known.digest == digest:
+        # The file has not been touched since it was extracted
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            pass
+        else:
+            if stat.st_size == known.size and stat.st_mtime_ns == known.mtime_ns:
+                return known
+    path.write_bytes(data)
+    return ManifestEntry(path.name, len(data), path.stat().st_mtime_ns, digest)
+
+
+def _digest(data: bytes | memoryview) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _describe_changes(data_a: memoryview, data_b: memoryview) -> str | None:
+    """Summarize where two payloads of equal size differ, or return None."""
+    if _digest(data_a) == _digest(data_b):
+        return None
+    ranges = _differing_ranges(data_a, data_b)
+    summary = ", ".join(f"{start:#x}-{end:#x}" for start, end in ranges[:8])
+    if len(ranges) > 8:
+        summary += f", ... ({len(ranges)} ranges)"
+    return f"{sum(end - start for start, end in ranges)} differ: {summary}"
+
+
+def _differing_ranges(
+    a: memoryview, b: memoryview, block_size: int = 4096
+) -> list[tuple[int, int]]:
+    """Return the half-open byte ranges where `a` and `b`, of equal size, differ.
+
+    Each differing block contributes one range, from its first to its last
+    differing byte, so equal bytes between two changes in a block are counted.
+    """
+    ranges: list[tuple[int, int]] = []
+    for block in range(0, len(a), block_size):
+        block_a = bytes(a[block : block + block_size])
+        block_b = bytes(b[block : block + block_size])
+        if block_a == block_b:
+            continue
+        # Bisect for the longest equal prefix, then the longest equal suffix
+        equal, differ = 0, len(block_a)
+        while differ - equal > 1:
+            middle = (equal + differ) // 2
+            if block_a[:middle] == block_b[:middle]:
+                equal = middle
+            else:
+                differ = middle
+        start = equal
+        differ, equal = start, len(block_a)
+        while equal - differ > 1:
+            middle = (differ + equal) // 2
+            if block_a[middle:] == block_b[middle:]:
+                equal = middle
+            else:
+                differ = middle
+        end = equal
+
+        if ranges and ranges[-1][1] == block + start:
+            ranges[-1] = (ranges[-1][0], block + end)
+        else:
+            ranges.append((block + start, block + end))
+    return ranges
+
+
+def _read_manifest(path: Path) -> dict[str, ManifestEntry]:
+    if not path.exists():
+        return {}
+    with open(path, newline="") as manifest_file:
+        return {
+            name: ManifestEntry(name, int(size), int(mtime_ns), digest)
+            for name, size, mtime_ns, digest in csv.reader(manifest_file)
+        }
+
+
+def _write_manifest(path: Path, entries: list[ManifestEntry]) -> None:
+    manifest = io.StringIO()
+    manifest_writer = csv.writer(manifest)
+    for entry in entries:
+        manifest_writer.writerow(
+            (entry.name, str(entry.size), str(entry.mtime_ns), entry.digest)
+        )
+    _write_if_changed(path, manifest.getvalue())
 
-    def iter_resources() -> Generator[Resource]:
-        for _ in range(num_resources):
-            hashkey = rmf.uint32LE()
-            offset = rmf.uint32LE()
-            rf.seek(offset)
-            yield _load_resource(rf, offset, hashkey)
 
-    return resource_archive_filename, iter_resources()
+def _write_if_changed(path: Path, text: str) -> None:
+    # Leave the file, and its modification time, alone when nothing changed
+    if path.exists():
+        with open(path, newline="") as f:
+            if f.read() == text:
+                return
+    with open(path, "w", newline="") as f:
+        f.write(text)
 
 
-def _load_resource(rf: FileBuffer, offset: int, hashkey: int) -> Resource:
-    rf.seek(offset)
-    name = rf.string(RES_FILENAME_LEN)
-    size = rf.uint32LE()
-    data = rf.read(size)
-    return Resource(
-        hashkey=hashkey,
-        name=name,
-        data=data,
-    )
+def _save_resource_map(
+    path: Path, archive_name: str, offsets_and_hashes: list[tuple[int, int]]
+) -> None:
+    resource_map_buffer = FileBuffer.growable()
+    resource_map_buffer.put_uint32LE(1)
+    resource_map_buffer.put_uint16LE(4)
+    resource_map_buffer.put_string(archive_name, RES_FILENAME_LEN)
+    resource_map_buffer.put_uint16LE(len(offsets_and_hashes))
+    for offset, hashnum in offsets_and_hashes:
+        resource_map_buffer.put_uint32LE(hashnum)
+        resource_map_buffer.put_uint32LE(offset)
+    resource_map_buffer.to_file(path)
+
+
+def _copy_file_range(src: BinaryIO, dst: BinaryIO, offset: int, size: int) -> None:
+    """Append `size` bytes from `offset` in `src` to `dst`.
+
+    The copy is done by the kernel where `os.copy_file_range` is available and
+    supported by the file systems, otherwise it goes through a small buffer.
+    """
+    dst.flush()
+    position = dst.tell()
+    if hasattr(os, "copy_file_range"):
+        try:
+            while size:
+                copied = os.copy_file_range(
+                    src.fileno(), dst.fileno(), size, offset, position
+                )
+                if not copied:
+                    raise ValueError("Data corruption")
+                offset += copied
+                position += copied
+                size -= copied
+        except OSError:
+            # EXDEV, EINVAL, ENOSYS and the like: fall back to copying
+            pass
+    src.seek(offset)
+    dst.seek(position)
+    while size:
+        chunk = src.read(min(size, COPY_CHUNK_SIZE))
+        if not chunk:
+            raise ValueError("Data corruption")
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+def _read_resource_list(
+    resource_list_reader: Iterator[list[str]], resource_dir_path: Path
+) -> list[tuple[str, int, Path]]:
+    """Return the names, keys and file paths of the listed resources."""
+    listed: list[tuple[str, int, Path]] = []
+    for resource_name, *columns in resource_list_reader:
+        resource_path = resource_dir_path / resource_name
+        if not resource_path.exists():
+            raise ValueError(f"{resource_path} does not exist")
+        if not columns or not columns[0]:
+            raise ValueError(f"{resource_name} is listed without a key")
+        listed.append((resource_name, int(columns[0]), resource_path))
+    return listed
+
+
+def _write_resource(f: BinaryIO, res: Resource) -> int:
+    offset = f.tell()
+    header = FileBuffer(RES_HEADER_LEN)
+    header.put_string(res.name, RES_FILENAME_LEN)
+    header.put_uint32LE(len(res.data))
+    f.write(memoryview(header))
+    f.write(res.data)
+    return offset
 
 
-def _save_resource_to_archive(rf: FileBuffer, res: Resource) -> int:
-    offset = rf.tell()
-    rf.put_string(res.name, RES_FILENAME_LEN)
-    rf.put_uint32LE(len(res.data))
-    rf.write(res.data)
-    return offset
+@contextmanager
+def _atomic_path(path: Path) -> Iterator[Path]:
+    """Yield a temporary path that replaces `path` once the block succeeds.
+
+    Readers of `path` see either the old or the new file, never a partial one,
+    and files opened before the replacement keep their old contents. The new
+    file keeps the permissions of the one it replaces, or gets 0o644.
+    """
+    try:
+        mode = path.stat().st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    tmp_path = Path(name)
+    try:
+        try:
+            # mkstemp creates the file readable by its owner only
+            os.fchmod(fd, mode)
+        finally:
+            os.close(fd)
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,168 @@
+import random
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+from filebuffer import FileBuffer
+
+from baktt.book import ITALICS, Book, ImageInfo, PageData, TextInfo
+
+
+def _page(rnd: random.Random, i: int) -> PageData:
+    text_blocks = []
+    for _ in range(rnd.randint(0, 4)):
+        words = " ".join(rnd.choice(("king", "of", "Krondor")) for _ in range(9))
+        text_blocks.append(
+            TextInfo(
+                paragraph=True,
+                skips=[rnd.randbytes(16)],
+                text=rnd.choice(("\\i", "\\I")) + words,
+            )
+        )
+    return PageData(
+        x_pos=i,
+        y_pos=2,
+        width=300,
+        height=200,
+        number=i + 1,
+        id=i,
+        prev_id=max(i - 1, 0),
+        next_id=i + 1,
+        flag=rnd.randint(0, 3),
+        show_number=bool(i % 2),
+        decorations=[ImageInfo(rnd.randint(0, 300), 20, 1, 0)],
+        first_letters=[ImageInfo(1, 2, 3, 4)],
+        text_blocks=text_blocks,
+        skips=[b"", rnd.randbytes(30)],
+    )
+
+
+def _make_book(path: Path, num_pages: int = 12) -> None:
+    rnd = random.Random(0)
+    Book(pages=[_page(rnd, i) for i in range(num_pages)]).to_file(path)
+
+
+def _edit_text(book: Book) -> None:
+    book.pages[3].text_blocks[0].text = "\\iA new first paragraph"
+
+
+def _delete(book: Book) -> None:
+    del book.pages[5]
+
+
+def _insert(book: Book) -> None:
+    book.pages.insert(2, _page(random.Random(1), 2))
+
+
+def _add_page(book: Book) -> None:
+    book.add_page(
+        x_pos=0,
+        y_pos=0,
+        width=300,
+        height=200,
+        flag=0,
+        show_number=True,
+        decorations=[],
+        first_letters=[],
+        text_blocks=[TextInfo(paragraph=True, skips=[bytes(16)], text="\\iThe end")],
+        skips=[b"", bytes(30)],
+    )
+
+
+def _delete_last(book: Book) -> None:
+    del book.pages[-1]
+
+
+def _no_edit(book: Book) -> None:
+    pass
+
+
+@pytest.mark.parametrize(
+    "edit", [_no_edit, _edit_text, _delete, _insert, _add_page, _delete_last]
+)
+def test_open_matches_from_file(tmp_path: Path, edit: Callable[[Book], None]) -> None:
+    path = tmp_path / "TEST.BOK"
+    _make_book(path)
+
+    lazy = Book.open(path)
+    edit(lazy)
+    lazy.to_file(tmp_path / "LAZY.BOK")
+    eager = Book.from_file(path)
+    edit(eager)
+    eager.to_file(tmp_path / "EAGER.BOK")
+
+    assert (tmp_path / "LAZY.BOK").read_bytes() == (tmp_path / "EAGER.BOK").read_bytes()
+    if edit is _no_edit:
+        assert (tmp_path / "LAZY.BOK").read_bytes() == path.read_bytes()
+
+
+def _page_as_read(seed: int) -> PageData:
+    page = _page(random.Random(seed), 0)
+    # Reading a page keeps the second copy of the next id
+    page.skips[0] = page.next_id.to_bytes(2, "little")
+    return page
+
+
+def _page_bytes(page: PageData) -> bytes:
+    buf = FileBuffer.growable()
+    page.write(buf, is_last=False)
+    buf.seek(0)
+    return buf.read()
+
+
+def _parse(data: bytes) -> PageData:
+    buf = FileBuffer(len(data))
+    buf.write(data)
+    buf.seek(0)
+    page = PageData.from_buf(buf)
+    assert buf.tell() == len(data)
+    return page
+
+
+def test_read_paragraphs() -> None:
+    page = _page_as_read(2)
+    page.text_blocks = [
+        TextInfo(paragraph=True, skips=[bytes(range(16))], text="\\iBoth \\Imarkers"),
+        TextInfo(paragraph=True, skips=[bytes(16)], text="\\I"),
+        TextInfo(paragraph=True, skips=[b"\xff" * 16], text="\\iThird \\i\\I"),
+    ]
+    data = _page_bytes(page)
+    # The paragraphs follow each other, each one starting with 0xF1
+    assert data.count(b"\xf1") == 3
+    assert _parse(data) == page
+
+    page.text_blocks = []
+    assert _parse(_page_bytes(page)) == page
+
+
+def test_read_growable() -> None:
+    page = _page_as_read(3)
+    buf = FileBuffer.growable()
+    buf.write(_page_bytes(page))
+    buf.seek(0)
+    assert PageData.from_buf(buf) == page
+
+
+def test_read_truncated() -> None:
+    data = _page_bytes(_page_as_read(4))
+    for end in range(len(data)):
+        with pytest.raises(ValueError, match="Data corruption"):
+            _parse(data[:end])
+
+    # A control byte other than 0xF0 or 0xF1 after a paragraph
+    with pytest.raises(ValueError, match="Data corruption"):
+        _parse(data[:-1] + b"\xf2")
+
+
+def test_text_encoding_follows_text() -> None:
+    text_info = TextInfo(paragraph=True, skips=[bytes(16)], text="\\iab")
+    assert text_info.bytes == ITALICS["\\i"] + b"ab"
+    assert text_info.size == 1 + 16 + 11 + 2
+
+    text_info.text = "\\Iabc\\i"
+    assert text_info.bytes == ITALICS["\\I"] + b"abc" + ITALICS["\\i"]
+    assert text_info.size == 1 + 16 + 11 + 3 + 11
+
+    text_info.bytes = ITALICS["\\i"] + b"x"
+    assert text_info.text == "\\ix"
+    assert text_info.size == 1 + 16 + 11 + 1
@@ -0,0 +1,88 @@
+import random
+from pathlib import Path
+
+import pytest
+
+from baktt.images import BMXResource, Image, SCXResource
+
+
+def _image(
+    rnd: random.Random, width: int, height: int, flags: int = 0, max_color: int = 255
+) -> Image:
+    # Mostly runs of a few colors, like the game's sprites
+    pixels = [
+        rnd.choice((0, 0, 0, 5, 7, rnd.randint(0, max_color)))
+        for _ in range(width * height)
+    ]
+    return Image(
+        width=width,
+        height=height,
+        flags=flags,
+        hires_locol=max_color < 16,
+        pixels=pixels,
+    )
+
+
+def _assert_same_image(image: Image, expected: Image) -> None:
+    assert (image.width, image.height, image.flags) == (
+        expected.width,
+        expected.height,
+        expected.flags,
+    )
+    assert list(image.pixels) == list(expected.pixels)
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [
+        BMXResource.COMPRESSION_LZW,
+        BMXResource.COMPRESSION_LZSS,
+        BMXResource.COMPRESSION_RLE,
+    ],
+)
+def test_bmx_round_trip(tmp_path: Path, compression: int) -> None:
+    rnd = random.Random(compression)
+    images = [
+        _image(rnd, 17, 9),
+        _image(rnd, 8, 23, Image.FLAG_XYSWAPPED),
+        _image(rnd, 40, 12, Image.FLAG_COMPRESSED),
+        _image(rnd, 13, 31, Image.FLAG_XYSWAPPED | Image.FLAG_COMPRESSED),
+    ]
+    bmx = BMXResource(compression=compression, images=images, skips=[b"\x12\x34"])
+    path = tmp_path / "TEST.BMX"
+    bmx.to_file(path)
+
+    loaded = BMXResource.from_file(path)
+    assert loaded.compression == compression
+    assert loaded.skips == [b"\x12\x34"]
+    assert len(loaded.images) == len(images)
+    for image, expected in zip(loaded.images, images, strict=True):
+        _assert_same_image(image, expected)
+
+    # Writing the loaded resource again gives the same file
+    copy_path = tmp_path / "COPY.BMX"
+    loaded.to_file(copy_path)
+    assert copy_path.read_bytes() == path.read_bytes()
+
+
+@pytest.mark.parametrize(
+    ("width", "height", "max_color"),
+    [
+        (SCXResource.SCREEN_WIDTH, SCXResource.SCREEN_HEIGHT, 255),
+        (SCXResource.BOOK_SCREEN_WIDTH, SCXResource.BOOK_SCREEN_HEIGHT, 15),
+    ],
+)
+def test_scx_round_trip(
+    tmp_path: Path, width: int, height: int, max_color: int
+) -> None:
+    image = _image(random.Random(width), width, height, max_color=max_color)
+    path = tmp_path / "TEST.SCX"
+    SCXResource(image=image).to_file(path)
+
+    loaded = SCXResource.from_file(path)
+    assert loaded.image.hires_locol == image.hires_locol
+    _assert_same_image(loaded.image, image)
+
+    copy_path = tmp_path / "COPY.SCX"
+    loaded.to_file(copy_path)
+    assert copy_path.read_bytes() == path.read_bytes()
@@ -0,0 +1,413 @@
+import csv
+import json
+import os
+import random
+import re
+import shutil
+import struct
+from pathlib import Path
+
+import pytest
+
+from baktt.resources import (
+    MAX_IN_FLIGHT_BYTES,
+    RES_FILENAME_LEN,
+    ResourceArchive,
+    _differing_ranges,
+    app,
+    archive_modified_resources,
+    archive_resources,
+    diff_resources,
+    extract_resource,
+    extract_resources,
+)
+
+
+def _make_archive(path: Path, num_resources: int = 20, seed: int = 0) -> Path:
+    """Write a `krondor.rmf` and `krondor.001` with random resources into `path`."""
+    rnd = random.Random(seed)
+    archive = bytearray()
+    hashes_and_offsets = []
+    for i in range(num_resources):
+        name = f"RES{i:03d}.{rnd.choice(['BMX', 'FNT', 'BOK', 'PAL'])}"
+        data = rnd.randbytes(rnd.randint(0, 5000))
+        hashes_and_offsets.append((rnd.getrandbits(32), len(archive)))
+        archive += name.encode().ljust(RES_FILENAME_LEN, b"\0")
+        archive += struct.pack("<I", len(data)) + data
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "krondor.001").write_bytes(archive)
+    resource_map = struct.pack("<IH", 1, 4)
+    resource_map += b"krondor.001".ljust(RES_FILENAME_LEN, b"\0")
+    resource_map += struct.pack("<H", num_resources)
+    for hashkey, offset in hashes_and_offsets:
+        resource_map += struct.pack("<II", hashkey, offset)
+    resource_map_path = path / "krondor.rmf"
+    resource_map_path.write_bytes(resource_map)
+    return resource_map_path
+
+
+def test_archive_modified_matches_full_archive(tmp_path: Path) -> None:
+    resource_map_path = _make_archive(tmp_path / "original")
+    extracted = tmp_path / "extracted"
+    extract_resources(resource_map_path, extracted)
+
+    # Modified resources at the start, in the middle, next to each other and at
+    # the end, growing, shrinking and emptied
+    modified = tmp_path / "modified"
+    modified.mkdir()
+    rnd = random.Random(1)
+    names = sorted(p.name for p in extracted.glob("RES*"))
+    for name, size in [
+        (names[0], 100),
+        (names[7], 6000),
+        (names[8], 0),
+        (names[-1], 1),
+    ]:
+        data = rnd.randbytes(size)
+        (modified / name).write_bytes(data)
+        (extracted / name).write_bytes(data)
+
+    archive_modified_resources(resource_map_path, modified, tmp_path / "spliced")
+    archive_resources(extracted / "_resources.csv", tmp_path / "rebuilt")
+    for name in ("krondor.rmf", "krondor.001"):
+        spliced = (tmp_path / "spliced" / name).read_bytes()
+        assert spliced == (tmp_path / "rebuilt" / name).read_bytes()
+
+
+def test_archive_modified_in_place(tmp_path: Path) -> None:
+    resource_map_path = _make_archive(tmp_path / "original")
+    expected = tmp_path / "expected"
+    shutil.copytree(tmp_path / "original", expected)
+
+    # With nothing modified, the archive replacing itself is unchanged
+    modified = tmp_path / "modified"
+    modified.mkdir()
+    archive_modified_resources(resource_map_path, modified, resource_map_path.parent)
+    for name in ("krondor.rmf", "krondor.001"):
+        assert (tmp_path / "original" / name).read_bytes() == (
+            expected / name
+        ).read_bytes()
+
+    # Replacing itself gives the same archive as writing elsewhere; file names
+    # match regardless of case
+    with ResourceArchive(resource_map_path) as archive:
+        resource_name = list(archive)[5].name
+    (modified / resource_name.lower()).write_bytes(b"modified")
+    archive_modified_resources(resource_map_path, modified, tmp_path / "elsewhere")
+    archive_modified_resources(resource_map_path, modified, resource_map_path.parent)
+    for name in ("krondor.rmf", "krondor.001"):
+        assert (tmp_path / "original" / name).read_bytes() == (
+            tmp_path / "elsewhere" / name
+        ).read_bytes()
+    with ResourceArchive(resource_map_path) as archive:
+        assert bytes(archive[resource_name].data) == b"modified"
+
+
+def test_archive_modified_errors(tmp_path: Path) -> None:
+    resource_map_path = _make_archive(tmp_path / "original")
+    with pytest.raises(ValueError, match="missing is not a directory"):
+        archive_modified_resources(
+            resource_map_path, tmp_path / "missing", tmp_path / "out"
+        )
+
+    modified = tmp_path / "modified"
+    modified.mkdir()
+    (modified / "RES001.BMX").write_bytes(b"")
+    (modified / "TYPO.BMX").write_bytes(b"")
+    with pytest.raises(ValueError, match=r"TYPO\.BMX in .* not in krondor\.001"):
+        archive_modified_resources(resource_map_path, modified, tmp_path / "out")
+    assert not (tmp_path / "out").exists()
+
+
+def _make_reversed_archive(path: Path, num_resources: int) -> Path:
+    """Like `_make_archive`, but with the map in reverse name order."""
+    extracted = path / "extracted"
+    extract_resources(_make_archive(path / "original", num_resources), extracted)
+    header, *rows = (extracted / "_resources.csv").read_text().splitlines()
+    (extracted / "_resources.csv").write_text("\n".join([header, *rows[::-1]]))
+    archive_resources(extracted / "_resources.csv", path / "reversed")
+    shutil.rmtree(extracted)
+    return path / "reversed" / "krondor.rmf"
+
+
+def _set_keys(resource_list_path: Path, keys: dict[str, str]) -> None:
+    lines = resource_list_path.read_text().splitlines()
+    for i, line in enumerate(lines[1:], 1):
+        name = line.split(",")[0]
+        if name in keys:
+            lines[i] = f"{name},{keys[name]}"
+    resource_list_path.write_text("\n".join(lines) + "\n")
+
+
+def test_archive_listed_without_key(tmp_path: Path) -> None:
+    extracted = tmp_path / "extracted"
+    resource_map_path = _make_archive(tmp_path / "original")
+    extract_resources(resource_map_path, extracted)
+    name = list(ResourceArchive(resource_map_path))[3].name
+    _set_keys(extracted / "_resources.csv", {name: ""})
+
+    with pytest.raises(ValueError, match=re.escape(f"{name} is listed without")):
+        archive_resources(extracted / "_resources.csv", tmp_path / "rebuilt")
+    assert not (tmp_path / "rebuilt").exists()
+
+
+def test_archive_verify_collisions(tmp_path: Path) -> None:
+    extracted = tmp_path / "extracted"
+    resource_map_path = _make_archive(tmp_path / "original")
+    extract_resources(resource_map_path, extracted)
+    resource_list_path = extracted / "_resources.csv"
+    archive_resources(resource_list_path, tmp_path / "unique", verify=True)
+
+    names = [entry.name for entry in ResourceArchive(resource_map_path)]
+    first, unique, second = names[2:5]
+    _set_keys(resource_list_path, {first: "7", second: "7"})
+    collision = f"{second}: key 0x00000007 collides with {first}"
+    with pytest.raises(ValueError, match=re.escape(collision)):
+        archive_resources(resource_list_path, tmp_path / "colliding", verify=True)
+    assert not (tmp_path / "colliding").exists()
+
+    archive_resources(resource_list_path, tmp_path / "colliding")
+    archive = ResourceArchive(tmp_path / "colliding" / "krondor.rmf")
+    assert archive.verify() == [collision]
+    with pytest.raises(ValueError, match=re.escape(f"used by {first}, {second}")):
+        archive.entry_by_hash(7)
+    entry = archive.entry(unique)
+    assert archive.entry_by_hash(entry.hashkey) == entry
+
+
+def test_extract_again_leaves_files_alone(tmp_path: Path) -> None:
+    resource_map_path = _make_archive(tmp_path / "original")
+    extracted = tmp_path / "extracted"
+    extract_resources(resource_map_path, extracted)
+    mtimes = {path.name: path.stat().st_mtime_ns for path in extracted.iterdir()}
+    assert {"_resources.csv", "_manifest.csv"} < mtimes.keys()
+
+    extract_resources(resource_map_path, extracted, jobs=4)
+    assert {
+        path.name: path.stat().st_mtime_ns for path in extracted.iterdir()
+    } == mtimes
+
+
+def test_differing_ranges() -> None:
+    rnd = random.Random(2)
+    a = rnd.randbytes(3 * 4096 + 100)
+    b = bytearray(a)
+    changed = [0, 17, 20, 4095, 4096, 8200, 3 * 4096 + 99]
+    for i in changed:
+        b[i] ^= 0xFF
+    assert _differing_ranges(memoryview(a), memoryview(b)) == [
+        (0, 4097),
+        (8200, 8201),
+        (3 * 4096 + 99, 3 * 4096 + 100),
+    ]
+    assert _differing_ranges(memoryview(a), memoryview(a)) == []
+
+
+def test_diff(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    resource_map_path = _make_archive(tmp_path / "original")
+    extracted = tmp_path / "extracted"
+    extract_resources(resource_map_path, extracted)
+    entries = list(ResourceArchive(resource_map_path))
+    resized, edited = entries[1], max(entries, key=lambda entry: entry.size)
+    (extracted / resized.name).write_bytes(bytes(resized.size + 3))
+    data = bytearray((extracted / edited.name).read_bytes())
+    data[10:12] = b"\xaa\xbb"
+    (extracted / edited.name).write_bytes(data)
+    archive_resources(extracted / "_resources.csv", tmp_path / "patched")
+    capsys.readouterr()
+
+    diff_resources(resource_map_path, tmp_path / "patched" / "krondor.rmf")
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[2:] == [
+        f"~ {resized.name}\t{resized.size} -> {resized.size + 3} bytes",
+        f"~ {edited.name}\t{edited.size} bytes, 2 differ: 0xa-0xc",
+        "0 added, 0 removed, 2 changed",
+    ]
+
+
+@pytest.mark.parametrize("name", ["krondor.rmf", "krondor.001"])
+def test_open_empty_file(tmp_path: Path, name: str) -> None:
+    resource_map_path = _make_archive(tmp_path)
+    (tmp_path / name).write_bytes(b"")
+    with pytest.raises(ValueError, match=f"{name} is empty"):
+        ResourceArchive(resource_map_path)
+
+
+def test_resource_archive(tmp_path: Path) -> None:
+    resource_map_path = _make_archive(tmp_path, num_resources=5)
+    archive_bytes = (tmp_path / "krondor.001").read_bytes()
+
+    with ResourceArchive(resource_map_path) as archive:
+        assert archive.archive_name == "krondor.001"
+        assert len(archive) == 5
+        entries = list(archive)
+        assert [entry.name[:6] for entry in entries] == [
+            f"RES{i:03d}" for i in range(5)
+        ]
+
+        entry = entries[2]
+        assert entry.name.lower() in archive
+        assert archive.entry(entry.name.lower()) == entry
+        assert "MISSING.BMX" not in archive
+        assert archive.entry_by_hash(entry.hashkey) == entry
+
+        data = archive.data(entry)
+        assert (
+            bytes(data)
+            == archive_bytes[entry.data_offset : entry.data_offset + entry.size]
+        )
+        assert archive_bytes[entry.offset : entry.data_offset].startswith(
+            entry.name.encode()
+        )
+        resource = archive[entry.name.lower()]
+        assert (resource.name, resource.hashkey) == (entry.name, entry.hashkey)
+        assert resource.data == data
+
+        # The mapping cannot be closed while resource data is in use
+        with pytest.raises(BufferError):
+            archive.close()
+        data.release()
+        resource.data.release()
+
+
+@pytest.mark.skipif(
+    not Path("/proc/self/maps").exists(), reason="needs /proc/self/maps"
+)
+def test_resource_archive_close(tmp_path: Path) -> None:
+    resource_map_path = _make_archive(tmp_path, num_resources=5)
+    archive_path = str(tmp_path / "krondor.001")
+    with ResourceArchive(resource_map_path) as archive:
+        archive.data(list(archive)[1]).release()
+        assert archive_path in Path("/proc/self/maps").read_text()
+    assert archive_path not in Path("/proc/self/maps").read_text()
+
+
+def test_extract_resource(tmp_path: Path) -> None:
+    resource_map_path = _make_archive(tmp_path / "original")
+    with ResourceArchive(resource_map_path) as archive:
+        entry = list(archive)[4]
+        expected = bytes(archive.data(entry))
+
+    extract_resource(resource_map_path, entry.name.lower(), tmp_path / "one")
+    assert [path.name for path in (tmp_path / "one").iterdir()] == [entry.name]
+    assert (tmp_path / "one" / entry.name).read_bytes() == expected
+
+    with pytest.raises(ValueError, match=r"MISSING\.BMX is not in krondor\.001"):
+        extract_resource(resource_map_path, "MISSING.BMX", tmp_path / "one")
+
+
+@pytest.mark.parametrize("sort", ["map", "name", "size"])
+def test_list_json(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str], sort: str
+) -> None:
+    resource_map_path = _make_reversed_archive(tmp_path, num_resources=8)
+    with ResourceArchive(resource_map_path) as archive:
+        entries = list(archive)
+    assert [entry.name for entry in entries] != sorted(entry.name for entry in entries)
+    expected = {
+        "map": entries,
+        "name": sorted(entries, key=lambda entry: entry.name),
+        "size": sorted(entries, key=lambda entry: entry.size, reverse=True),
+    }[sort]
+
+    app(
+        ["list", str(resource_map_path), "--json", "--sort", sort],
+        result_action="return_value",
+    )
+    listing = json.loads(capsys.readouterr().out)
+    assert listing == {
+        "archive": "krondor.001",
+        "resources": [
+            {
+                "name": entry.name,
+                "hashkey": entry.hashkey,
+                "offset": entry.offset,
+                "size": entry.size,
+            }
+            for entry in expected
+        ],
+    }
+
+
+def test_list(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    resource_map_path = _make_archive(tmp_path, num_resources=3)
+    with ResourceArchive(resource_map_path) as archive:
+        entries = list(archive)
+
+    app(["list", str(resource_map_path)], result_action="return_value")
+    assert capsys.readouterr().out.splitlines() == [
+        "Archive: krondor.001",
+        *(f"{entry.name}\t{entry.size} bytes" for entry in entries),
+    ]
+
+
+@pytest.mark.parametrize("max_in_flight", [1, 10_000, MAX_IN_FLIGHT_BYTES])
+def test_extract_jobs(tmp_path: Path, max_in_flight: int) -> None:
+    resource_map_path = _make_reversed_archive(tmp_path, num_resources=40)
+    with ResourceArchive(resource_map_path) as archive:
+        expected = {entry.name: bytes(archive.data(entry)) for entry in archive}
+        keys = [(entry.name, str(entry.hashkey)) for entry in archive]
+
+    extracted = tmp_path / "extracted"
+    extract_resources(resource_map_path, extracted, jobs=4, max_in_flight=max_in_flight)
+    # Written by the workers in any order, but listed in map order
+    for name, data in expected.items():
+        assert (extracted / name).read_bytes() == data
+    with open(extracted / "_resources.csv", newline="") as f:
+        assert list(csv.reader(f)) == [["krondor.rmf", "krondor.001"], *map(list, keys)]
+    with open(extracted / "_manifest.csv", newline="") as f:
+        assert [row[0] for row in csv.reader(f)] == list(expected)
+
+
+def test_archive_replaces_map_last(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    extracted = tmp_path / "extracted"
+    extract_resources(_make_archive(tmp_path / "original"), extracted)
+    modified = tmp_path / "modified"
+    modified.mkdir()
+
+    replaced: list[str] = []
+
+    def replace(src: Path, dst: Path) -> None:
+        replaced.append(Path(dst).name)
+        os_replace(src, dst)
+
+    os_replace = os.replace
+    monkeypatch.setattr(os, "replace", replace)
+    archive_resources(extracted / "_resources.csv", tmp_path / "rebuilt")
+    archive_modified_resources(
+        tmp_path / "rebuilt" / "krondor.rmf", modified, tmp_path / "rebuilt"
+    )
+    assert replaced == ["krondor.001", "krondor.rmf"] * 2
+
+
+def test_archive_failed_write(tmp_path: Path) -> None:
+    extracted = tmp_path / "extracted"
+    extract_resources(_make_archive(tmp_path / "original"), extracted)
+    save_to = tmp_path / "rebuilt"
+    archive_resources(extracted / "_resources.csv", save_to)
+    before = {path.name: path.read_bytes() for path in save_to.iterdir()}
+
+    # A listed resource that cannot be read fails halfway through the archive
+    name = sorted(path.name for path in extracted.glob("RES*"))[10]
+    (extracted / name).unlink()
+    (extracted / name).mkdir()
+    with pytest.raises(IsADirectoryError):
+        archive_resources(extracted / "_resources.csv", save_to)
+    # The previous archive is left as it was, without temporary files
+    assert {path.name: path.read_bytes() for path in save_to.iterdir()} == before
+
+
+def test_archive_permissions(tmp_path: Path) -> None:
+    extracted = tmp_path / "extracted"
+    extract_resources(_make_archive(tmp_path / "original"), extracted)
+    save_to = tmp_path / "rebuilt"
+    archive_resources(extracted / "_resources.csv", save_to)
+    assert (save_to / "krondor.001").stat().st_mode & 0o777 == 0o644
+
+    # Replacing a file keeps its permissions
+    (save_to / "krondor.rmf").chmod(0o600)
+    archive_resources(extracted / "_resources.csv", save_to)
+    assert (save_to / "krondor.rmf").stat().st_mode & 0o777 == 0o600
+    assert (save_to / "krondor.001").stat().st_mode & 0o777 == 0o644